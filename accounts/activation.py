@@ -0,0 +1,184 @@
+import json
+import os
+import time
+from .authentication import AccountActivationTokenGenerator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from .mail import (
+    deliver,
+    MailSender,
+    outbox_worker,
+    render_emails,
+    start_outbox_worker,
+)
+from .models import OutgoingEmail
+
+
+User = get_user_model()
+
+ACTIVATION_SUBJECT = 'Activate your account.'
+ACTIVATION_TEMPLATE = 'accounts/activate_account'
+
+
+def get_activate_url(user_obj, token):
+    uid = urlsafe_base64_encode(force_bytes(user_obj.id)).decode('utf-8')
+    return settings.UI_URL + settings.UI_ACCOUNT_ACTIVATE_PATH + uid + '/' + token + '/'
+
+
+def iter_unactivated_users(chunk_size, after=None, joined_before=None):
+    """
+    Yields the users who never activated their account in chunks of `chunk_size`, ordered by
+    (date_joined, id) and read from the (is_active, date_joined, id) index, after the (date_joined, id)
+    position `after`. Deactivated users, who have an activation time, are left out. Only the fields used by
+    the activation email are loaded.
+    """
+    queryset = User.objects.filter(is_active=False, activated__isnull=True).only(
+        'id', 'email', 'first_name', 'is_active', 'date_joined')
+    if joined_before is not None:
+        queryset = queryset.filter(date_joined__lt=joined_before)
+    queryset = queryset.order_by('date_joined', 'pk')
+    while True:
+        if after is not None:
+            date_joined, pk = after
+            chunk = queryset.filter(Q(date_joined__gt=date_joined) | Q(date_joined=date_joined, pk__gt=pk))
+        else:
+            chunk = queryset
+        chunk = list(chunk[:chunk_size])
+        if chunk:
+            yield chunk
+        if len(chunk) < chunk_size:
+            return
+        after = (chunk[-1].date_joined, chunk[-1].pk)
+
+
+def build_activation_emails(users):
+    """
+    Returns the activation email of every user as (to, text, html), with the templates rendered in one pass.
+    """
+    token_generator = AccountActivationTokenGenerator()
+    contexts = [{
+        'first_name': user_obj.first_name,
+        'activate_url': get_activate_url(user_obj, token_generator.make_token(user_obj)),
+    } for user_obj in users]
+    rendered = render_emails(ACTIVATION_TEMPLATE, contexts)
+    return [(user_obj.email, text, html) for user_obj, (html, text) in zip(users, rendered)]
+
+
+class RateLimiter:
+    """
+    Paces the calls of wait() to at most `rate` per second (no limit when the rate is not set).
+    """
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.count = 0
+
+    def wait(self):
+        if self.rate:
+            delay = self.start + self.count / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self.count += 1
+
+
+class Checkpoint:
+    """
+    Progress of a resend job stored in a JSON file: the (date_joined, id) position of the last processed
+    user and the totals so far. Without a path, the progress isn't stored.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.position = None
+        self.sent = 0
+        self.failed = 0
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return
+        with open(self.path) as checkpoint_file:
+            data = json.load(checkpoint_file)
+        self.position = (parse_datetime(data['date_joined']), data['id'])
+        self.sent = data['sent']
+        self.failed = data['failed']
+
+    def save(self, user_obj):
+        self.position = (user_obj.date_joined, user_obj.pk)
+        if self.path is None:
+            return
+        data = {'date_joined': user_obj.date_joined.isoformat(), 'id': user_obj.pk,
+                'sent': self.sent, 'failed': self.failed}
+        # Written to a temporary file first, so an interrupted write doesn't lose the progress.
+        with open(self.path + '.tmp', 'w') as checkpoint_file:
+            json.dump(data, checkpoint_file)
+        os.replace(self.path + '.tmp', self.path)
+
+    def clear(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ActivationMailer:
+    """
+    Sends the activation emails through the outbox delivery, over one connection kept open for the whole
+    job and reopened only after a failed send. With EMAIL_OUTBOX, the emails of a chunk are queued in the
+    outbox by one insert instead.
+    """
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.outbox = getattr(settings, 'EMAIL_OUTBOX', False)
+        self.sender = None if self.outbox else MailSender(wait=limiter.wait)
+
+    @property
+    def connections(self):
+        return self.sender.connections if self.sender is not None else 0
+
+    def send(self, emails):
+        """
+        Returns the numbers of sent (or queued) and failed emails.
+        """
+        emails = [OutgoingEmail(to=to, from_email=settings.DEFAULT_FROM_EMAIL, subject=ACTIVATION_SUBJECT,
+                                body=text, html_body=html) for to, text, html in emails]
+        if self.outbox:
+            for _ in emails:
+                self.limiter.wait()
+            OutgoingEmail.objects.bulk_create(emails)
+            if start_outbox_worker():
+                outbox_worker.wake()
+            return len(emails), 0
+        sent, failed, _ = deliver(emails, self.sender)
+        return sent, failed
+
+    def close(self):
+        if self.sender is not None:
+            self.sender.close()
+
+
+def resend_activation_emails(chunk_size=None, rate=None, checkpoint_path=None, joined_before=None):
+    """
+    Sends the activation email again to every user who never activated the account, reading them in
+    chunks of `chunk_size` (ACTIVATION_RESEND_CHUNK_SIZE by default) at most `rate` emails per second
+    (ACTIVATION_RESEND_RATE by default). The progress is saved to the checkpoint file after every chunk, so
+    an interrupted job resumes after the last processed user; the file is removed when the job completes.
+    Returns the numbers of sent (or queued) and failed emails, including those of the resumed runs, and of
+    opened connections.
+    """
+    chunk_size = chunk_size or getattr(settings, 'ACTIVATION_RESEND_CHUNK_SIZE', 100)
+    if rate is None:
+        rate = getattr(settings, 'ACTIVATION_RESEND_RATE', None)
+    checkpoint = Checkpoint(checkpoint_path)
+    checkpoint.load()
+    mailer = ActivationMailer(RateLimiter(rate))
+    try:
+        for users in iter_unactivated_users(chunk_size, checkpoint.position, joined_before):
+            sent, failed = mailer.send(build_activation_emails(users))
+            checkpoint.sent += sent
+            checkpoint.failed += failed
+            checkpoint.save(users[-1])
+    finally:
+        mailer.close()
+    checkpoint.clear()
+    return checkpoint.sent, checkpoint.failed, mailer.connections
@@ -5,7 +5,10 @@ from .forms import (
     AdminUserChangeForm,
     AdminUserCreationForm,
 )
-from .models import Token
+from .models import (
+    OutgoingEmail,
+    Token,
+)
 
 
 User = get_user_model()
@@ -37,8 +40,18 @@ class TokenAdmin(admin.ModelAdmin):
     model = Token
     list_display = ['key', 'user', 'created', 'updated', 'logout']
     list_display_links = list_display
+    list_select_related = ['user']
     search_fields = ['user__email', 'key']
 
 
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    model = OutgoingEmail
+    list_display = ['id', 'to', 'subject', 'created', 'attempts', 'next_attempt', 'sent']
+    list_display_links = list_display
+    list_filter = ['sent', 'created']
+    search_fields = ['to', 'subject']
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Token, TokenAdmin)
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -1,61 +1,174 @@
+from accounts.cache import (
+    token_cache,
+    TokenSnapshot,
+)
 from accounts.models import (
     Token,
 )
+from accounts.principal import set_principal
+from accounts.signing import (
+    get_user_state,
+    SignedToken,
+)
+from accounts.tokens import touch_token
 from django.conf import settings
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.signing import BadSignature
 from django.utils import timezone
 from django.utils.six import text_type
 from rest_framework.authentication import (
+    BaseAuthentication,
     get_authorization_header,
     TokenAuthentication,
 )
 from rest_framework.exceptions import (
+    APIException,
     AuthenticationFailed,
     PermissionDenied
 )
 
 
+def get_token_from_request(request, keyword='Token'):
+    auth = get_authorization_header(request).split()
+
+    if not auth or auth[0].lower() != keyword.lower().encode():
+        return None
+
+    if len(auth) == 1:
+        return None
+    elif len(auth) > 2:
+        return None
+
+    try:
+        token = auth[1].decode()
+    except UnicodeError:
+        return None
+
+    return token
+
+
 class ExpiringTokenAuthentication(TokenAuthentication):
     model = Token
 
     def authenticate(self, request):
-        auth = get_authorization_header(request).split()
+        """
+        The result is cached on the underlying HttpRequest, so TokenMiddleware and the view share
+        a single token lookup and touch per request. The request principal is set when the view authenticates.
+        """
+        http_request = getattr(request, '_request', request)
+        if not hasattr(http_request, '_token_authentication'):
+            try:
+                http_request._token_authentication = (self.authenticate_token_header(request), None)
+            except APIException as e:
+                http_request._token_authentication = (None, e)
+        result, exc = http_request._token_authentication
+        if exc is not None:
+            raise exc
+        if result is not None and http_request is not request:
+            set_principal(request, *result)
+        return result
 
-        if not auth or auth[0].lower() != self.keyword.lower().encode():
+    def authenticate_token_header(self, request):
+        token = get_token_from_request(request, self.keyword)
+        if token is None:
             return None
+        return self.authenticate_credentials(token)
 
-        if len(auth) == 1:
-            return None
-        elif len(auth) > 2:
-            return None
+    def authenticate_credentials(self, key):
+        """
+        Token state is read through the token cache, so a cache hit doesn't query the database.
+        With TOKEN_COMPACT_USER, the user is a CompactUser, and a cache miss reads only the needed columns.
+        """
+        if getattr(settings, 'TOKEN_COMPACT_USER', False):
+            token, user = self.get_compact_token(key)
+        else:
+            token = self.get_token(key)
+            user = token.user
+        if token.logout:
+            raise AuthenticationFailed('Invalid token.')
+        if not user.is_active:
+            raise PermissionDenied('User inactive or deleted.')
 
-        try:
-            token = auth[1].decode()
-        except UnicodeError:
-            return None
+        now = timezone.now()
+        if token.updated < now - settings.TOKEN_EXPIRATION_TIME:
+            raise AuthenticationFailed('Token has expired.')
 
-        return self.authenticate_credentials(token)
+        self.touch(token, now)
+        return user, token
 
-    def authenticate_credentials(self, key):
+    def get_token(self, key):
+        snapshot = token_cache.get(key)
+        if snapshot is not None:
+            return snapshot.get_token()
         model = self.get_model()
-
         try:
             token = model.objects.select_related('user').get(key=key)
-        # except Exception as e:
-        #     print(e)
         except model.DoesNotExist:
             raise AuthenticationFailed('Invalid token.')
-        if token.logout:
-            raise AuthenticationFailed('Invalid token.')
-        if not token.user.is_active:
-            raise PermissionDenied('User inactive or deleted.')
+        token_cache.add(key, TokenSnapshot.from_token(token))
+        return token
+
+    def get_compact_token(self, key):
+        """
+        Returns the token and its CompactUser.
+        """
+        snapshot = token_cache.get(key)
+        if snapshot is None:
+            snapshot = TokenSnapshot.load(key)
+            if snapshot is None:
+                raise AuthenticationFailed('Invalid token.')
+            token_cache.add(key, snapshot)
+        return snapshot.get_compact_token()
+
+    def touch(self, token, now):
+        """
+        Slides the token expiration. The new `updated` value is persisted only when the stored one
+        is older than TOKEN_REFRESH_INTERVAL. The touch is recorded in the token cache apart from the snapshot,
+        which isn't rebuilt from this request as it may predate a concurrent logout or deactivation.
+        """
+        refresh_interval = getattr(settings, 'TOKEN_REFRESH_INTERVAL', None)
+        if refresh_interval and now - token.updated < refresh_interval:
+            return
+        token.updated = now
+        touch_token(token.key, now)
+        token_cache.touch(token.key, now)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authentication with the stateless signed tokens issued at login when SIGNED_TOKENS is enabled.
+    A token is verified without a database query, the user's token generation and flags are held in cache.
+    No token is accepted while SIGNED_TOKENS is disabled, as the cache holding the revocations then isn't
+    checked to be shared between processes.
+    """
+    keyword = 'Bearer'
 
-        if token.updated < timezone.now() - settings.TOKEN_EXPIRATION_TIME:
+    def authenticate(self, request):
+        if not getattr(settings, 'SIGNED_TOKENS', False):
+            return None
+        token = get_token_from_request(request, self.keyword)
+        if token is None:
+            return None
+        user, token = self.authenticate_credentials(token)
+        set_principal(request, user, token)
+        return user, token
+
+    def authenticate_credentials(self, key):
+        try:
+            token = SignedToken.from_string(key)
+        except (BadSignature, ValueError):
+            raise AuthenticationFailed('Invalid token.')
+        if token.is_expired:
             raise AuthenticationFailed('Token has expired.')
+        state = get_user_state(token.user_id)
+        if state is None or state.generation != token.generation:
+            raise AuthenticationFailed('Invalid token.')
+        if not state.is_active:
+            raise PermissionDenied('User inactive or deleted.')
+        return state.get_user(token.user_id), token
 
-        token.updated = timezone.now()
-        token.save()
-        return token.user, token
+    def authenticate_header(self, request):
+        return self.keyword
 
 
 class AccountActivationTokenGenerator(PasswordResetTokenGenerator):
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import (
+    DateTimeField,
+    F,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .cache import token_cache
+from .models import Token
+from .signing import invalidate_user_states
+
+
+User = get_user_model()
+
+
+class BulkUpdateResult:
+    """
+    Number of updated users and of their revoked tokens (without the signed tokens, which aren't stored).
+    """
+    def __init__(self, updated=0, revoked_tokens=0):
+        self.updated = updated
+        self.revoked_tokens = revoked_tokens
+
+    def as_dict(self):
+        return {'updated': self.updated, 'revoked_tokens': self.revoked_tokens}
+
+
+def reduces_access(changes):
+    """
+    Whether the changes take a flag away from the users, e.g. deactivate them.
+    """
+    return any(value is False for value in changes.values())
+
+
+def bulk_update_users(queryset, changes, revoke_tokens=None):
+    """
+    Applies the field changes to the users of the queryset with one UPDATE whatever their number.
+    With `revoke_tokens` (by default when the changes reduce access), their tokens are logged out by one UPDATE
+    and their signed tokens revoked (by bumping their token generation) in the same transaction. The users are
+    selected by subqueries, so no id list is bound to the statements.
+
+    The cached token and signed token state of the users is dropped after the commit, as it holds their flags.
+    Their token keys and ids are read for that only when the token cache or the signed tokens are enabled.
+    """
+    if revoke_tokens is None:
+        revoke_tokens = reduces_access(changes)
+    queryset = queryset.order_by()
+    keys = []
+    user_ids = []
+    revoked = 0
+    with transaction.atomic():
+        tokens = Token.objects.filter(user__in=queryset.values('id'), logout=False)
+        # Read before the users are updated, as the changes may take them out of the queryset filters.
+        if token_cache.enabled:
+            keys = list(tokens.values_list('key', flat=True))
+        if getattr(settings, 'SIGNED_TOKENS', False):
+            user_ids = list(queryset.values_list('id', flat=True))
+        if revoke_tokens:
+            revoked = tokens.update(logout=True)
+        now = timezone.now()
+        values = dict(changes, updated=now)
+        if changes.get('is_active'):
+            values['activated'] = Coalesce('activated', Value(now, output_field=DateTimeField()))
+        if revoke_tokens:
+            values['token_generation'] = F('token_generation') + 1
+        updated = queryset.update(**values)
+    if keys:
+        token_cache.delete_many(keys)
+    if user_ids:
+        invalidate_user_states(user_ids)
+    return BulkUpdateResult(updated, revoked)
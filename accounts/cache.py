@@ -0,0 +1,328 @@
+from accounts.models import (
+    Token,
+    User,
+)
+from collections import (
+    namedtuple,
+    OrderedDict,
+)
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache with a time to live for every entry.
+    """
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def add(self, key, value):
+        """
+        Sets the value only when the key is missing or expired. Returns whether it was set.
+        """
+        if self.get(key) is not None:
+            return False
+        self.set(key, value)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SettingsLRUCache:
+    """
+    Lazily built LRUCache, sized by the `size_setting` and `timeout_setting` settings. Disabled when
+    the size is not set.
+    """
+    def __init__(self, size_setting, timeout_setting, default_timeout):
+        self.size_setting = size_setting
+        self.timeout_setting = timeout_setting
+        self.default_timeout = default_timeout
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def get_cache(self):
+        maxsize = getattr(settings, self.size_setting, 0)
+        if not maxsize:
+            return None
+        timeout = getattr(settings, self.timeout_setting, self.default_timeout)
+        cache = self._cache
+        if cache is None or (cache.maxsize, cache.timeout) != (maxsize, timeout):
+            with self._lock:
+                cache = self._cache = LRUCache(maxsize, timeout)
+        return cache
+
+
+def build_instance(model, values):
+    """
+    Builds a model instance from the given field values without a query. The other fields are deferred.
+    """
+    field_names = [field.attname for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+class CompactUser:
+    """
+    The id, email and flags of the authenticated user, built from the cached token or user state without
+    a query or a model instance. The full User is loaded by one query on first access to another attribute,
+    with the changes of the compact attributes applied, so a view can still save the request user.
+    Not equal to the User model instance, compare users by `pk`.
+    """
+    __slots__ = ('id', 'email', 'is_active', 'is_admin', 'is_superuser', '_user', '_changed')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, email, is_active, is_admin, is_superuser):
+        for name, value in zip(self.__slots__, (id, email, is_active, is_admin, is_superuser, None, ())):
+            object.__setattr__(self, name, value)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def is_staff(self):
+        return self.is_admin
+
+    def get_user(self):
+        if self._user is None:
+            user = User.objects.get(pk=self.id)
+            for name in self._changed:
+                setattr(user, name, getattr(self, name))
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_user', '_changed'):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __setattr__(self, name, value):
+        if name not in self.__slots__ or name.startswith('_'):
+            setattr(self.get_user(), name, value)
+            return
+        object.__setattr__(self, name, value)
+        if self._user is not None:
+            setattr(self._user, name, value)
+        elif name not in self._changed:
+            object.__setattr__(self, '_changed', self._changed + (name,))
+
+    def __str__(self):
+        return self.email
+
+
+def max_time(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class TokenSnapshot(namedtuple('TokenSnapshot', ['key', 'updated', 'logout', 'user_id', 'email', 'is_active',
+                                                 'is_admin', 'is_superuser'])):
+    """
+    Compact token state with the user flags needed for authentication.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_token(cls, token):
+        user = token.user
+        return cls(token.key, token.updated, token.logout, user.id, user.email, user.is_active, user.is_admin,
+                   user.is_superuser)
+
+    @classmethod
+    def load(cls, key):
+        """
+        Reads the token state with only the needed columns of the token and its user, without building
+        model instances. Returns None for an unknown key.
+        """
+        rows = list(Token.objects.filter(key=key).order_by().values_list(
+            'key', 'updated', 'logout', 'user_id', 'user__email', 'user__is_active', 'user__is_admin',
+            'user__is_superuser')[:1])
+        return cls(*rows[0]) if rows else None
+
+    def get_compact_token(self):
+        """
+        Returns the token, without its user, and the CompactUser, built without a query.
+        """
+        token = build_instance(Token, {
+            'key': self.key,
+            'user_id': self.user_id,
+            'updated': self.updated,
+            'logout': self.logout,
+        })
+        return token, CompactUser(self.user_id, self.email, self.is_active, self.is_admin, self.is_superuser)
+
+    def get_token(self):
+        """
+        Returns the token with its user, built without a query. The remaining fields are deferred
+        and loaded on first access.
+        """
+        user = build_instance(User, {
+            'id': self.user_id,
+            'email': self.email,
+            'is_active': self.is_active,
+            'is_admin': self.is_admin,
+            'is_superuser': self.is_superuser,
+        })
+        token = build_instance(Token, {
+            'key': self.key,
+            'user_id': self.user_id,
+            'updated': self.updated,
+            'logout': self.logout,
+        })
+        token.user = user
+        return token
+
+
+class TokenCache:
+    """
+    Read-through token cache. The shared tier uses the Django cache set by TOKEN_CACHE_ALIAS,
+    the in-process LRU tier is enabled by TOKEN_CACHE_LOCAL_SIZE. Both are disabled by default.
+    A logout or deactivation is seen by other processes after TOKEN_CACHE_LOCAL_TIMEOUT when the shared tier
+    is a cache shared between processes (e.g. memcached or redis), but only after TOKEN_CACHE_TIMEOUT when it is
+    a per-process backend such as the local memory cache. Snapshots are filled with add(), never overwritten
+    by a request, so a concurrent invalidation isn't undone by a snapshot read before it. The touches are
+    cached under their own keys.
+    """
+    key_prefix = 'accounts:token:'
+    touched_prefix = 'accounts:token-touched:'
+
+    def __init__(self):
+        self._local = SettingsLRUCache('TOKEN_CACHE_LOCAL_SIZE', 'TOKEN_CACHE_LOCAL_TIMEOUT', 5)
+
+    @property
+    def enabled(self):
+        return bool(getattr(settings, 'TOKEN_CACHE_ALIAS', None) or getattr(settings, 'TOKEN_CACHE_LOCAL_SIZE', 0))
+
+    def get_shared(self):
+        alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None)
+        return caches[alias] if alias else None
+
+    def get_local(self):
+        return self._local.get_cache()
+
+    def get(self, key):
+        """
+        Returns the cached snapshot, with `updated` moved to the cached touch time when that is newer.
+        """
+        snapshot = touched = None
+        local = self.get_local()
+        if local is not None:
+            snapshot = local.get(key)
+            touched = local.get(self.touched_prefix + key)
+        if snapshot is None:
+            shared = self.get_shared()
+            if shared is not None:
+                values = shared.get_many([self.key_prefix + key, self.touched_prefix + key])
+                snapshot = values.get(self.key_prefix + key)
+                touched = max_time(touched, values.get(self.touched_prefix + key))
+                if snapshot is not None and local is not None:
+                    local.set(key, snapshot)
+        if snapshot is not None and touched is not None and touched > snapshot.updated:
+            snapshot = snapshot._replace(updated=touched)
+        return snapshot
+
+    def set(self, key, snapshot):
+        local = self.get_local()
+        if local is not None:
+            local.set(key, snapshot)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.set(self.key_prefix + key, snapshot, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+
+    def add(self, key, snapshot):
+        local = self.get_local()
+        if local is not None:
+            local.add(key, snapshot)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.add(self.key_prefix + key, snapshot, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+
+    def touch(self, key, when):
+        """
+        Records a token touch apart from the snapshot, so it moves the cached expiration without an invalidation.
+        A touch can't bring back a logged out token, whose snapshot is dropped.
+        """
+        local = self.get_local()
+        if local is not None:
+            local.set(self.touched_prefix + key, when)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.set(self.touched_prefix + key, when, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+
+    def delete_many(self, keys):
+        local = self.get_local()
+        if local is not None:
+            for key in keys:
+                local.delete(key)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.delete_many([self.key_prefix + key for key in keys])
+
+    def delete(self, key):
+        self.delete_many([key])
+
+
+token_cache = TokenCache()
+
+
+class UnknownEmailCache:
+    """
+    In-process TTL set of emails recently missed at login, so repeated attempts for an unknown email
+    don't query the database. Emails are discarded on registration in this process; other processes
+    see a new user after LOGIN_UNKNOWN_EMAIL_CACHE_TIMEOUT at the latest.
+    """
+    def __init__(self):
+        self._emails = SettingsLRUCache('LOGIN_UNKNOWN_EMAIL_CACHE_SIZE', 'LOGIN_UNKNOWN_EMAIL_CACHE_TIMEOUT', 60)
+
+    def __contains__(self, email):
+        emails = self._emails.get_cache()
+        return emails is not None and emails.get(email, False)
+
+    def add(self, email):
+        emails = self._emails.get_cache()
+        if emails is not None:
+            emails.set(email, True)
+
+    def discard(self, email):
+        emails = self._emails.get_cache()
+        if emails is not None:
+            emails.delete(email)
+
+
+unknown_emails = UnknownEmailCache()
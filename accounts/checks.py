@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import (
+    Error,
+    register,
+)
+
+
+# Cache backends holding their data in the memory of each process.
+PER_PROCESS_CACHE_BACKENDS = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register()
+def check_signed_tokens_cache(app_configs, **kwargs):
+    """
+    The signed token revocation drops the user state from the cache, which must be shared between processes.
+    """
+    if not getattr(settings, 'SIGNED_TOKENS', False):
+        return []
+    alias = getattr(settings, 'TOKEN_CACHE_ALIAS', None) or 'default'
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PER_PROCESS_CACHE_BACKENDS:
+        return [Error(
+            "SIGNED_TOKENS requires a cache shared between processes, the '%s' cache is per-process." % alias,
+            hint='Set TOKEN_CACHE_ALIAS to a memcached, redis or database cache.',
+            id='accounts.E001',
+        )]
+    return []
@@ -0,0 +1,71 @@
+import csv
+import json
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from .serializers import AdminUserListCreateSerializer
+
+
+# The fields of the admin user list, without the write-only password fields.
+EXPORT_FIELDS = tuple(field for field in AdminUserListCreateSerializer.Meta.fields
+                      if field not in ('password', 'password_confirm'))
+
+
+def get_chunk_size():
+    return getattr(settings, 'USERS_EXPORT_CHUNK_SIZE', 1000)
+
+
+def iter_users(queryset, chunk_size=None):
+    """
+    Yields the EXPORT_FIELDS values of the users, read in chunks of `chunk_size` rows walking the
+    (date_joined, id) index, so memory use doesn't depend on the number of users.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    queryset = queryset.order_by('date_joined', 'pk').values_list(*EXPORT_FIELDS)
+    date_joined_index, id_index = EXPORT_FIELDS.index('date_joined'), EXPORT_FIELDS.index('id')
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        for row in chunk:
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        date_joined, pk = chunk[-1][date_joined_index], chunk[-1][id_index]
+        chunk = list(queryset.filter(
+            Q(date_joined__gt=date_joined) | Q(date_joined=date_joined, pk__gt=pk))[:chunk_size])
+
+
+def export_value(value):
+    """
+    Same representation as the serializer fields, e.g. ISO 8601 datetimes with 'Z' for UTC.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+    return value
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, map(export_value, row)))) + '\n'
+
+
+class _Line:
+    """
+    File-like object returning what is written, for csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(['' if value is None else export_value(value) for value in row])
+
+
+EXPORT_FORMATS = {
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+    'csv': (csv_lines, 'text/csv'),
+}
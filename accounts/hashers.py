@@ -0,0 +1,166 @@
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+import os
+import threading
+import time
+
+
+class HashingUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Service temporarily unavailable, try again later.'
+    default_code = 'hashing_unavailable'
+
+
+class PasswordHashingExecutor:
+    """
+    Runs password hashing in a bounded process pool, so CPU-bound hashing doesn't hold the request threads.
+    At most `workers + queue_size` hashings are accepted at a time; a caller waits up to `timeout` seconds
+    for a slot, then HashingUnavailable is raised.
+    """
+    def __init__(self, workers, queue_size=0, timeout=None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self._pool = None
+        self.completed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HashingUnavailable()
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def release(self, latency):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        self._slots.release()
+
+    def run(self, func, *args):
+        self.acquire()
+        start = time.perf_counter()
+        try:
+            return self.get_pool().submit(func, *args).result()
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def map(self, func, iterable):
+        """
+        Same as run() for every item, the calls running in parallel. Returns the results in order.
+        """
+        futures = []
+        for item in iterable:
+            self.acquire()
+            start = time.perf_counter()
+            future = self.get_pool().submit(func, item)
+            future.add_done_callback(lambda _, start=start: self.release(time.perf_counter() - start))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def stats(self):
+        """
+        Returns the queue depth and latency (in seconds) metrics.
+        """
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'average_latency': self.total_latency / self.completed if self.completed else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+
+_executor_lock = threading.Lock()
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the executor configured by PASSWORD_HASHING_WORKERS, or None when hashing runs inline.
+    """
+    global _executor
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', None)
+    if not workers:
+        return None
+    queue_size = getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 0)
+    timeout = getattr(settings, 'PASSWORD_HASHING_TIMEOUT', 5)
+    config = (workers, queue_size, timeout)
+    with _executor_lock:
+        if _executor is None or (_executor.workers, _executor.queue_size, _executor.timeout) != config:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = PasswordHashingExecutor(*config)
+        return _executor
+
+
+def check_password(user, raw_password):
+    """
+    Same as `user.check_password(raw_password)`, with the verification run by the hashing executor.
+    """
+    executor = get_executor()
+    if executor is None:
+        return user.check_password(raw_password)
+    if not executor.run(hashers.check_password, raw_password, user.password):
+        return False
+    preferred = hashers.get_hasher('default')
+    hasher = hashers.identify_hasher(user.password)
+    if hasher.algorithm != preferred.algorithm or preferred.must_update(user.password):
+        set_password(user, raw_password)
+        user.save(update_fields=['password'])
+    return True
+
+
+def set_password(user, raw_password):
+    """
+    Same as `user.set_password(raw_password)`, with the hashing run by the hashing executor.
+    """
+    executor = get_executor()
+    if executor is None:
+        user.set_password(raw_password)
+        return
+    user.password = executor.run(hashers.make_password, raw_password)
+    user._password = raw_password
+
+
+def make_passwords(raw_passwords):
+    """
+    Returns the hashes of the passwords, computed in parallel by the hashing executor or, when hashing runs
+    inline, by a thread per CPU (hashlib releases the GIL while hashing).
+    """
+    executor = get_executor()
+    if executor is not None:
+        return executor.map(hashers.make_password, raw_passwords)
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as pool:
+        return list(pool.map(hashers.make_password, raw_passwords))
@@ -0,0 +1,163 @@
+import csv
+import json
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.utils import timezone
+from .cache import unknown_emails
+from .hashers import make_passwords
+from .serializers import AdminUserListCreateSerializer
+
+
+User = get_user_model()
+
+DUPLICATE_EMAIL_ERROR = 'user with this email already exists.'
+
+
+class UserImportSerializer(AdminUserListCreateSerializer):
+    """
+    The admin user create rules without the unique email validator, which queries once per row.
+    The duplicates of a chunk are found by one query instead.
+    """
+    class Meta(AdminUserListCreateSerializer.Meta):
+        extra_kwargs = {
+            'email': {
+                'validators': []
+            }
+        }
+
+
+class ImportResult:
+    """
+    Number of created users and the errors of the rejected rows, by row number (from 1).
+    """
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    @property
+    def failed(self):
+        return len(self.errors)
+
+    def add_error(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def get_chunk_size():
+    return getattr(settings, 'USERS_IMPORT_CHUNK_SIZE', 500)
+
+
+def ndjson_rows(lines):
+    """
+    Yields (row number, data) of the non-empty lines, the data being None when the line isn't a JSON object.
+    """
+    number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        yield number, data if isinstance(data, dict) else None
+
+
+def csv_rows(lines):
+    """
+    Yields (row number, data) of the rows after the header. Empty cells are missing values.
+    """
+    for number, row in enumerate(csv.DictReader(lines), 1):
+        yield number, {field: value for field, value in row.items() if field is not None and value not in ('', None)}
+
+
+IMPORT_FORMATS = {
+    'ndjson': ndjson_rows,
+    'csv': csv_rows,
+}
+
+
+def exclude_duplicates(numbered_users, result):
+    """
+    Drops the users whose email is taken by an existing user (found by one query) or by an earlier row.
+    """
+    emails = [user_obj.email for _, user_obj in numbered_users]
+    taken = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    unique = []
+    for number, user_obj in numbered_users:
+        if user_obj.email in taken:
+            result.add_error(number, {'email': [DUPLICATE_EMAIL_ERROR]})
+        else:
+            taken.add(user_obj.email)
+            unique.append((number, user_obj))
+    return unique
+
+
+def insert_users(numbered_users, result, retry=True):
+    # bulk_create() doesn't call save(), which records the activation.
+    now = timezone.now()
+    for _, user_obj in numbered_users:
+        if user_obj.is_active and user_obj.activated is None:
+            user_obj.activated = now
+    try:
+        with transaction.atomic():
+            User.objects.bulk_create([user_obj for _, user_obj in numbered_users])
+    except IntegrityError:
+        if not retry:
+            raise
+        # An email taken by another request since the duplicates query.
+        insert_users(exclude_duplicates(numbered_users, result), result, retry=False)
+        return
+    result.created += len(numbered_users)
+    # bulk_create() doesn't send post_save, which lets a new email log in.
+    for _, user_obj in numbered_users:
+        unknown_emails.discard(user_obj.email)
+
+
+def import_chunk(rows, result):
+    numbered_users = []
+    for number, data in rows:
+        if data is None:
+            result.add_error(number, {'non_field_errors': ['Invalid row.']})
+            continue
+        serializer = UserImportSerializer(data=data)
+        if not serializer.is_valid():
+            result.add_error(number, serializer.errors)
+            continue
+        fields = dict(serializer.validated_data)
+        fields.pop('password_confirm')
+        numbered_users.append((number, User(**fields)))
+    numbered_users = exclude_duplicates(numbered_users, result)
+    if not numbered_users:
+        return
+    # The password field holds the raw password until here.
+    passwords = make_passwords([user_obj.password for _, user_obj in numbered_users])
+    for (_, user_obj), password in zip(numbered_users, passwords):
+        user_obj.password = password
+    insert_users(numbered_users, result)
+
+
+def import_users(rows, chunk_size=None):
+    """
+    Creates the users of the (row number, data) rows, validated by the admin user create rules. Each chunk of
+    `chunk_size` rows costs one query for the duplicate emails and one insert, with the passwords hashed in
+    parallel. Invalid rows are reported in the returned ImportResult without stopping the import.
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    result = ImportResult()
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            import_chunk(chunk, result)
+            chunk = []
+    if chunk:
+        import_chunk(chunk, result)
+    result.errors.sort(key=lambda error: error['row'])
+    return result
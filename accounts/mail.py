@@ -0,0 +1,258 @@
+import html
+import logging
+import re
+import threading
+import time
+from accounts.models import OutgoingEmail
+from accounts.tokens import start_periodic_thread
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import (
+    EmailMultiAlternatives,
+    get_connection,
+    send_mail,
+)
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import F
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_email_templates(template_name):
+    """
+    Returns the compiled `<template_name>.html` and `<template_name>.txt` templates (None when there is no text
+    template). With the cached template loader, they are compiled once per process.
+    """
+    html_template = get_template(template_name + '.html')
+    try:
+        text_template = get_template(template_name + '.txt')
+    except TemplateDoesNotExist:
+        text_template = None
+    return html_template, text_template
+
+
+def html_to_text(html_message):
+    """
+    Plain text version of an HTML email: tags stripped, entities unescaped, lines trimmed and
+    blank lines collapsed.
+    """
+    lines = [line.strip() for line in html.unescape(strip_tags(html_message)).splitlines()]
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+def render_email(template_name, context):
+    """
+    Renders the HTML and the text part of an email. Without a text template, the text part is derived
+    from the HTML. Returns (html, text).
+    """
+    return render_emails(template_name, [context])[0]
+
+
+def render_emails(template_name, contexts):
+    """
+    Renders the HTML and the text parts of an email for every context, e.g. for every recipient of a bulk send,
+    with the templates looked up once. Returns a list of (html, text).
+    """
+    html_template, text_template = get_email_templates(template_name)
+    rendered = []
+    for context in contexts:
+        html_message = html_template.render(context)
+        if text_template is None:
+            text_message = html_to_text(html_message)
+        else:
+            text_message = text_template.render(context)
+        rendered.append((html_message, text_message))
+    return rendered
+
+
+def send_email(subject, body, to, html_message=None, from_email=None):
+    """
+    Sends an email to one recipient. With EMAIL_OUTBOX, the email is only stored in the outbox (in the
+    current transaction) and delivered later by the outbox worker or the send_queued_mail command.
+    Returns the number of sent or queued emails.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    if not getattr(settings, 'EMAIL_OUTBOX', False):
+        return send_mail(subject, body, from_email, [to], html_message=html_message, fail_silently=False)
+    OutgoingEmail.objects.create(to=to, from_email=from_email, subject=subject, body=body,
+                                 html_body=html_message or '')
+    if start_outbox_worker():
+        transaction.on_commit(outbox_worker.wake)
+    return 1
+
+
+def build_message(email, mail_connection):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email, [email.to],
+                                     connection=mail_connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+class DeliveryStats:
+    """
+    Counters of the outbox deliveries of this process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+        self.seconds = 0.0
+
+    def record(self, sent, failed, connections, seconds):
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.connections += connections
+            self.seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'connections': self.connections,
+                'seconds': self.seconds,
+                'messages_per_second': self.sent / self.seconds if self.seconds else 0.0,
+            }
+
+
+delivery_stats = DeliveryStats()
+
+
+class MailSender:
+    """
+    Sends messages over one connection, opened on the first send and reopened only after a failed send.
+    `wait` is called before every send, e.g. to pace the sends.
+    """
+    def __init__(self, wait=None):
+        self.wait = wait
+        self.connection = get_connection(fail_silently=False)
+        self.is_open = False
+        self.connections = 0
+
+    def send(self, message):
+        """
+        Returns the exception of a failed send, None when the message was sent.
+        """
+        if self.wait is not None:
+            self.wait()
+        try:
+            if not self.is_open:
+                self.connection.open()
+                self.is_open = True
+                self.connections += 1
+            self.connection.send_messages([message])
+        except Exception as e:
+            # The connection may be broken, the next message gets a new one.
+            self.close()
+            return e
+        return None
+
+    def close(self):
+        self.connection.close()
+        self.is_open = False
+
+
+def deliver(emails, sender=None):
+    """
+    Sends the emails over one connection (the one of `sender` when given, kept open), reopened only after
+    a failed send. A failed outbox email gets its next attempt delayed by EMAIL_OUTBOX_RETRY_DELAY, doubled
+    with every failed attempt. Emails not stored in the outbox are only sent.
+    Returns the numbers of sent and failed emails and of opened connections.
+    """
+    retry_delay = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', timedelta(minutes=1))
+    start = time.perf_counter()
+    own_sender = sender is None
+    if own_sender:
+        sender = MailSender()
+    connections = sender.connections
+    sent = []
+    failed = 0
+    try:
+        for email in emails:
+            error = sender.send(build_message(email, sender.connection))
+            if error is None:
+                sent.append(email)
+                continue
+            logger.warning('Sending the email %s to %s failed: %s', email.pk, email.to, error)
+            failed += 1
+            if email.pk is not None:
+                email.attempts += 1
+                email.next_attempt = timezone.now() + retry_delay * 2 ** (email.attempts - 1)
+                email.last_error = str(error)
+                email.save(update_fields=['attempts', 'next_attempt', 'last_error'])
+    finally:
+        if own_sender:
+            sender.close()
+    connections = sender.connections - connections
+    if any(email.pk is not None for email in emails):
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in sent]).update(
+            sent=timezone.now(), attempts=F('attempts') + 1)
+        delivery_stats.record(len(sent), failed, connections, time.perf_counter() - start)
+    return len(sent), failed, connections
+
+
+def send_queued_mail(batch_size=None):
+    """
+    Delivers the pending outbox emails in batches of at most `batch_size` (EMAIL_OUTBOX_BATCH_SIZE by default),
+    one connection per batch. The rows of a batch are locked (skipping the rows locked by another worker, where
+    the database supports it) until the batch is sent. Returns the numbers of sent and failed emails and of
+    opened connections.
+    """
+    batch_size = batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 100)
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    totals = [0, 0, 0]
+    while True:
+        with transaction.atomic():
+            emails = list(OutgoingEmail.objects.pending(max_attempts).select_for_update(
+                skip_locked=skip_locked)[:batch_size])
+            if not emails:
+                return tuple(totals)
+            totals = [total + count for total, count in zip(totals, deliver(emails))]
+
+
+class OutboxWorker:
+    """
+    Delivers the outbox emails in a background thread, right after an email is queued and once per interval
+    for the retries.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._event = threading.Event()
+
+    def start(self, interval):
+        with self._lock:
+            if self._thread is None:
+                self._thread = start_periodic_thread('email-outbox', interval, send_queued_mail, self._event)
+
+    def wake(self):
+        self._event.set()
+
+
+outbox_worker = OutboxWorker()
+
+
+def start_outbox_worker():
+    """
+    Starts the outbox worker when EMAIL_OUTBOX_INTERVAL is set. Returns whether the worker runs.
+    """
+    interval = getattr(settings, 'EMAIL_OUTBOX_INTERVAL', None)
+    if interval:
+        outbox_worker.start(interval)
+        return True
+    return False
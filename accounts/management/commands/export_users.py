@@ -0,0 +1,37 @@
+from accounts.export import (
+    EXPORT_FORMATS,
+    iter_users,
+)
+from accounts.models import User
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = 'Exports the users as NDJSON or CSV, reading them in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='ndjson', dest='export_format')
+        parser.add_argument('--output', default=None,
+                            help='Path of the exported file. The users are written to stdout when not set.')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Number of users read by one query (USERS_EXPORT_CHUNK_SIZE by default).')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        lines, _ = EXPORT_FORMATS[options['export_format']]
+        self.exported = 0
+        rows = self.count(iter_users(User.objects.all(), chunk_size=options['chunk_size']))
+        if options['output'] is None:
+            for line in lines(rows):
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', newline='') as output:
+            output.writelines(lines(rows))
+        self.stdout.write(self.style.SUCCESS('Exported %s users in %.2f seconds.' % (
+            self.exported, time.perf_counter() - start)))
+
+    def count(self, rows):
+        for row in rows:
+            self.exported += 1
+            yield row
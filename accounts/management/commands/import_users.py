@@ -0,0 +1,31 @@
+from accounts.imports import (
+    IMPORT_FORMATS,
+    import_users,
+)
+from django.core.management.base import BaseCommand
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = 'Imports users from an NDJSON or CSV file, validating, hashing and inserting them in chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path of the file to import, or - for stdin.')
+        parser.add_argument('--format', choices=sorted(IMPORT_FORMATS), default='ndjson', dest='import_format')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Number of rows inserted by one query (USERS_IMPORT_CHUNK_SIZE by default).')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = IMPORT_FORMATS[options['import_format']]
+        if options['path'] == '-':
+            result = import_users(rows(sys.stdin), chunk_size=options['chunk_size'])
+        else:
+            with open(options['path'], newline='', encoding='utf-8', errors='replace') as lines:
+                result = import_users(rows(lines), chunk_size=options['chunk_size'])
+        for error in result.errors:
+            self.stderr.write('Row %s: %s' % (error['row'], '; '.join(
+                '%s: %s' % (field, ' '.join(messages)) for field, messages in error['errors'].items())))
+        self.stdout.write(self.style.SUCCESS('Imported %s users, %s rows failed, in %.2f seconds.' % (
+            result.created, result.failed, time.perf_counter() - start)))
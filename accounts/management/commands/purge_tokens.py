@@ -0,0 +1,19 @@
+from accounts.tokens import purge_tokens
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = 'Deletes logged out tokens and tokens older than TOKEN_EXPIRATION_TIME in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of tokens deleted by one statement.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Pause between batches, in seconds.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        deleted = purge_tokens(batch_size=options['batch_size'], sleep=options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %s tokens in %.2f seconds.' % (deleted, time.perf_counter() - start)))
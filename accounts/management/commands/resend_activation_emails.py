@@ -0,0 +1,39 @@
+from accounts.activation import resend_activation_emails
+from accounts.filters import parse_moment
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from rest_framework.exceptions import ValidationError
+import time
+
+
+class Command(BaseCommand):
+    help = ('Sends the activation email again to the users who never activated their account, in chunks over one '
+            'connection, rate limited.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Number of users read and mailed together (ACTIVATION_RESEND_CHUNK_SIZE by default).')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Maximum number of emails per second (ACTIVATION_RESEND_RATE by default).')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Path of the progress file. An interrupted job run again with the same file '
+                                 'resumes after the last processed user.')
+        parser.add_argument('--joined-before', default=None,
+                            help='Only the users who joined before this date or datetime.')
+
+    def handle(self, *args, **options):
+        joined_before = None
+        if options['joined_before']:
+            try:
+                joined_before = parse_moment('joined_before', options['joined_before'])
+            except ValidationError:
+                raise CommandError('--joined-before must be a date or a datetime.')
+        start = time.perf_counter()
+        sent, failed, connections = resend_activation_emails(
+            chunk_size=options['chunk_size'], rate=options['rate'], checkpoint_path=options['checkpoint'],
+            joined_before=joined_before)
+        self.stdout.write(self.style.SUCCESS(
+            'Sent %s activation emails, %s failed, over %s connections in %.2f seconds.'
+            % (sent, failed, connections, time.perf_counter() - start)))
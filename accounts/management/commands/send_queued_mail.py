@@ -0,0 +1,20 @@
+from accounts.mail import send_queued_mail
+from django.core.management.base import BaseCommand
+import time
+
+
+class Command(BaseCommand):
+    help = 'Sends the emails queued in the outbox (EMAIL_OUTBOX) which are due for a delivery attempt.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Maximum number of emails sent over one connection '
+                                 '(EMAIL_OUTBOX_BATCH_SIZE by default).')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        sent, failed, connections = send_queued_mail(batch_size=options['batch_size'])
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Sent %s emails, %s failed, over %s connections in %.2f seconds (%.1f emails/s).'
+            % (sent, failed, connections, seconds, sent / seconds if seconds else 0)))
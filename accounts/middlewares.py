@@ -1,27 +1,8 @@
-from accounts.models import (
-    Token,
+from accounts.authentication import (
+    ExpiringTokenAuthentication,
+    get_token_from_request,  # noqa: F401
 )
-from django.utils import timezone
-from rest_framework.authentication import get_authorization_header
-
-
-def get_token_from_request(request):
-    auth = get_authorization_header(request).split()
-
-    if not auth or auth[0].lower() != 'Token'.lower().encode():
-        return None
-
-    if len(auth) == 1:
-        return None
-    elif len(auth) > 2:
-        return None
-
-    try:
-        token = auth[1].decode()
-    except UnicodeError:
-        return None
-
-    return token
+from rest_framework.exceptions import APIException
 
 
 class TokenMiddleware:
@@ -32,12 +13,12 @@ class TokenMiddleware:
         return self.get_response(request)
 
     def process_view(self, request, view_func, view_args, view_kwargs):
-        token = get_token_from_request(request)
-        if token:
-            try:
-                token = Token.objects.get(key=token)
-                token.updated = timezone.now()
-                token.save()
-            except Exception as e:
-                print(e)
+        """
+        Touches the request token. The result is shared with ExpiringTokenAuthentication, so an API view
+        doesn't look up or touch the token again.
+        """
+        try:
+            ExpiringTokenAuthentication().authenticate(request)
+        except APIException:
+            pass
         return None
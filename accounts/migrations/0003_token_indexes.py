@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-17 19:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_token_generation'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='token',
+            options={'ordering': ['-created'], 'verbose_name': 'Token', 'verbose_name_plural': 'Tokens'},
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['created'], name='token_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['logout', 'updated'], name='token_logout_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='token',
+            index=models.Index(fields=['user', 'logout'], name='token_user_logout_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def set_activated(apps, schema_editor):
+    # The users who are active or have logged in were activated, at the latest when they joined.
+    User = apps.get_model('accounts', 'User')
+    User.objects.filter(Q(is_active=True) | Q(last_login__isnull=False)).update(activated=F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='activated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_activated, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,7 @@ from django.contrib.auth.models import (
 )
 from django.core.validators import RegexValidator
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from os import urandom
@@ -46,15 +47,38 @@ class User(AbstractBaseUser):
     date_joined = models.DateTimeField(default=timezone.now)
     last_login = models.DateTimeField(blank=True, null=True)
     updated = models.DateTimeField(auto_now=True)
+    activated = models.DateTimeField(blank=True, null=True)
     is_active = models.BooleanField(default=False)
     is_admin = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
+    token_generation = models.PositiveIntegerField(default=0)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
     EMAIL_FIELD = 'email'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_joined', 'id'], name='user_date_joined_id_idx'),
+            models.Index(fields=['is_active', 'date_joined', 'id'], name='user_active_joined_idx'),
+            models.Index(fields=['is_admin', 'date_joined', 'id'], name='user_admin_joined_idx'),
+            models.Index(fields=['last_login'], name='user_last_login_idx'),
+            models.Index(fields=['last_name'], name='user_last_name_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Records the first activation, e.g. by an admin, so a deactivated user isn't sent the activation email again.
+        """
+        if not self.get_deferred_fields().intersection({'is_active', 'activated'}) and self.is_active \
+                and self.activated is None:
+            self.activated = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'activated' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['activated']
+        super(User, self).save(*args, **kwargs)
+
     def get_full_name(self):
         return self.email
 
@@ -75,6 +99,21 @@ class User(AbstractBaseUser):
         return self.is_admin
 
 
+class TokenManager(models.Manager):
+    def active(self, user):
+        """
+        Tokens of the user which are not logged out, served by the (user, logout) index.
+        """
+        return self.filter(user=user, logout=False).order_by()
+
+    def purgeable(self):
+        """
+        Logged out and expired tokens, served by the (logout, updated) index.
+        """
+        expired = timezone.now() - settings.TOKEN_EXPIRATION_TIME
+        return self.filter(Q(logout=True) | Q(logout=False, updated__lt=expired)).order_by()
+
+
 class Token(models.Model):
     key = models.CharField(_("Key"), max_length=40, primary_key=True)
     user = models.ForeignKey(
@@ -85,10 +124,17 @@ class Token(models.Model):
     updated = models.DateTimeField(auto_now=True)
     logout = models.BooleanField(default=False)
 
+    objects = TokenManager()
+
     class Meta:
         verbose_name = _("Token")
         verbose_name_plural = _("Tokens")
-        ordering = ['-updated', '-created']
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['created'], name='token_created_idx'),
+            models.Index(fields=['logout', 'updated'], name='token_logout_updated_idx'),
+            models.Index(fields=['user', 'logout'], name='token_user_logout_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.key:
@@ -100,3 +146,41 @@ class Token(models.Model):
 
     def __str__(self):
         return self.key
+
+
+class OutgoingEmailManager(models.Manager):
+    def pending(self, max_attempts):
+        """
+        Unsent emails due for a delivery attempt, served by the (sent, next_attempt) index.
+        """
+        return self.filter(
+            sent__isnull=True,
+            next_attempt__lte=timezone.now(),
+            attempts__lt=max_attempts,
+        ).order_by('next_attempt')
+
+
+class OutgoingEmail(models.Model):
+    to = models.EmailField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    objects = OutgoingEmailManager()
+
+    class Meta:
+        verbose_name = _("Outgoing email")
+        verbose_name_plural = _("Outgoing emails")
+        ordering = ['-created']
+        indexes = [
+            models.Index(fields=['sent', 'next_attempt'], name='outgoing_email_pending_idx'),
+        ]
+
+    def __str__(self):
+        return '%s: %s' % (self.to, self.subject)
@@ -0,0 +1,99 @@
+from base64 import (
+    urlsafe_b64decode,
+    urlsafe_b64encode,
+)
+from collections import OrderedDict
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import (
+    remove_query_param,
+    replace_query_param,
+)
+
+
+class UserCursorPagination(BasePagination):
+    """
+    Keyset pagination of users on (date_joined, id), served by the (date_joined, id) index. A page is fetched
+    with one range query whatever its position, unlike offset pagination. The page size is USERS_PAGE_SIZE,
+    changed with the `page_size` query parameter up to USERS_PAGE_MAX_SIZE.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'USERS_PAGE_SIZE', 100)
+        max_page_size = getattr(settings, 'USERS_PAGE_MAX_SIZE', 1000)
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(max(requested, 1), max_page_size)
+
+    def encode_cursor(self, user_obj, reverse):
+        position = '%s|%s|%s' % ('r' if reverse else 'n', user_obj.date_joined.isoformat(), user_obj.pk)
+        cursor = urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """
+        Returns (reverse, date_joined, id) of the cursor, or None on the first page.
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            direction, date_joined, pk = urlsafe_b64decode(cursor.encode('ascii')).decode('ascii').split('|')
+            date_joined = parse_datetime(date_joined)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if direction not in ('n', 'r') or date_joined is None:
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'r', date_joined, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = False
+        if cursor is None:
+            queryset = queryset.order_by('date_joined', 'pk')
+        else:
+            reverse, date_joined, pk = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(date_joined__lt=date_joined) | Q(date_joined=date_joined, pk__lt=pk)
+                ).order_by('-date_joined', '-pk')
+            else:
+                queryset = queryset.filter(
+                    Q(date_joined__gt=date_joined) | Q(date_joined=date_joined, pk__gt=pk)
+                ).order_by('date_joined', 'pk')
+
+        # One extra row tells whether there is a further page.
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+        if reverse:
+            page.reverse()
+            has_next, has_previous = cursor is not None, has_more
+        else:
+            has_next, has_previous = has_more, cursor is not None
+
+        self.next_url = self.encode_cursor(page[-1], False) if page and has_next else None
+        self.previous_url = self.encode_cursor(page[0], True) if page and has_previous else None
+        if not page and cursor is not None:
+            # Past the end of the list, e.g. after the last users were deleted.
+            self.previous_url = remove_query_param(self.base_url, self.cursor_query_param)
+        return page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.next_url),
+            ('previous', self.previous_url),
+            ('results', data),
+        ]))
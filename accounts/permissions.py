@@ -1,3 +1,4 @@
+from accounts.principal import get_principal
 from rest_framework.permissions import (
     BasePermission,
     SAFE_METHODS,
@@ -6,26 +7,28 @@ from rest_framework.permissions import (
 
 class IsAuthenticatedAndActive(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.is_active
+        return get_principal(request).is_active
 
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.is_admin
+        return get_principal(request).is_admin
 
 
 class IsOwnerOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in SAFE_METHODS:
             return True
-        return obj.id == request.user.id
+        return obj.id == get_principal(request).user_id
 
 
 class IsOwnerOrAdmin(BasePermission):
     def has_permission(self, request, view):
-        return request.user.id == int(view.kwargs['pk']) or request.user.is_admin
+        principal = get_principal(request)
+        return principal.is_admin or principal.user_id == int(view.kwargs['pk'])
 
 
 class IsOwnerOrAdminObject(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.id == request.user.id or request.user.is_admin
+        principal = get_principal(request)
+        return principal.is_admin or obj.id == principal.user_id
@@ -0,0 +1,47 @@
+class Principal:
+    """
+    The requesting user's id and flags and the key of the request token, computed once per request by
+    the authentication and read by the permissions and the views as plain attributes.
+    """
+    __slots__ = ('user_id', 'is_active', 'is_admin', 'token_key')
+
+    def __init__(self, user_id, is_active, is_admin, token_key):
+        self.user_id = user_id
+        self.is_active = is_active
+        self.is_admin = is_admin
+        self.token_key = token_key
+
+    @classmethod
+    def from_user(cls, user, token=None):
+        if user is None or not user.is_authenticated:
+            return ANONYMOUS
+        return cls(user.id, bool(user.is_active), bool(getattr(user, 'is_admin', False)), getattr(token, 'key', None))
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+
+ANONYMOUS = Principal(None, False, False, None)
+
+
+def set_principal(request, user, token):
+    http_request = getattr(request, '_request', request)
+    http_request._principal = Principal.from_user(user, token)
+
+
+def get_principal(request):
+    """
+    Returns the principal of the request. It is set by the accounts authentication classes, otherwise
+    (an anonymous request or another authentication class) computed from the request user on first use.
+    """
+    try:
+        return request._request._principal
+    except AttributeError:
+        pass
+    http_request = getattr(request, '_request', request)
+    user = request.user
+    principal = getattr(http_request, '_principal', None)
+    if principal is None:
+        principal = http_request._principal = Principal.from_user(user, getattr(request, 'auth', None))
+    return principal
@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
-from .models import Token
+from .cache import unknown_emails
+from .hashers import (
+    check_password,
+    set_password,
+)
+from .signing import SignedToken
+from .tokens import issue_token
 from rest_framework.exceptions import (
     AuthenticationFailed,
     PermissionDenied,
 )
 from rest_framework.serializers import (
+    BooleanField,
     CharField,
     EmailField,
+    IntegerField,
+    ListField,
     ModelSerializer,
     Serializer,
     ValidationError,
@@ -55,7 +65,7 @@ class UserCreateSerializer(ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password_confirm')
         user_obj = User(**validated_data)
-        user_obj.set_password(validated_data['password'])
+        set_password(user_obj, validated_data['password'])
         user_obj.save()
         return user_obj
 
@@ -108,6 +118,29 @@ class AdminUserRetrieveUpdateSerializer(ModelSerializer):
         read_only_fields = ['id']
 
 
+class AdminUserBulkUpdateSerializer(Serializer):
+    """
+    User bulk update serializer for admin only. Meant to be used with partial=True, so only the given
+    fields are changed.
+    """
+    ids = ListField(label='User ids', child=IntegerField(), required=False)
+    is_active = BooleanField(label='Active', required=False)
+    is_admin = BooleanField(label='Admin', required=False)
+    is_superuser = BooleanField(label='Superuser', required=False)
+    revoke_tokens = BooleanField(label='Revoke tokens', required=False)
+
+    change_fields = ('is_active', 'is_admin', 'is_superuser')
+
+    def validate(self, data):
+        if not any(field in data for field in self.change_fields):
+            raise ValidationError('Set at least one of: %s.' % ', '.join(self.change_fields))
+        return data
+
+    @property
+    def changes(self):
+        return {field: value for field, value in self.validated_data.items() if field in self.change_fields}
+
+
 class UserLoginSerializer(Serializer):
     """
     User login serializer.
@@ -119,21 +152,36 @@ class UserLoginSerializer(Serializer):
     def validate(self, data):
         email = data['email']
         password = data['password']
-        try:
-            user_obj = User.objects.get(email=email)
-        except User.DoesNotExist:
-            raise PermissionDenied("User with this email does not exists.")
-        if not user_obj.check_password(password):
+        user_obj = None
+        if email not in unknown_emails:
+            try:
+                user_obj = User.objects.get(email=email)
+            except User.DoesNotExist:
+                unknown_emails.add(email)
+        if user_obj is None:
+            self.reject_unknown_email(password)
+        if not check_password(user_obj, password):
             raise AuthenticationFailed("Incorrect credentials please try again.")
-        if user_obj.check_password(password):
-            if not user_obj.is_active:
-                raise PermissionDenied("User is inactive.")
-            user_obj.last_login = timezone.now()
-            user_obj.save()
+        if not user_obj.is_active:
+            raise PermissionDenied("User is inactive.")
+        user_obj.last_login = timezone.now()
+        user_obj.save(update_fields=['last_login', 'updated'])
+
+        if getattr(settings, 'SIGNED_TOKENS', False):
+            data['token'] = SignedToken.create(user_obj)
+        else:
+            data['token'] = issue_token(user_obj)
+        return data
 
-            data['token'] = Token.objects.create(user=user_obj)
-            return data
-        raise AuthenticationFailed("Invalid credentials.")
+    def reject_unknown_email(self, password):
+        """
+        With LOGIN_DUMMY_HASH, an unknown email costs a password hashing and gets the same response
+        as an incorrect password, so neither the timing nor the response reveals whether the email exists.
+        """
+        if getattr(settings, 'LOGIN_DUMMY_HASH', False):
+            set_password(User(), password)
+            raise AuthenticationFailed("Incorrect credentials please try again.")
+        raise PermissionDenied("User with this email does not exists.")
 
 
 class UserPasswordChangeSerializer(Serializer):
@@ -145,14 +193,8 @@ class UserPasswordChangeSerializer(Serializer):
     password_new_confirm = CharField(label='Confirm New Password', write_only=True)
 
     def validate_password(self, value):
-        data = self.get_initial()
-        user = self.context['request'].user
-        password = data.get('password')
-        try:
-            user_obj = User.objects.get(email=user)
-        except User.DoesNotExist:
-            raise ValidationError("User with this email does not exist.")
-        if not user_obj.check_password(password):
+        user_obj = self.context['request'].user
+        if not check_password(user_obj, value):
             raise ValidationError("You passed invalid password.")
         return value
 
@@ -208,11 +250,14 @@ class UserPasswordResetSerializer(Serializer):
     """
     email = EmailField(label='E-mail')
 
+    user_obj = None
+
     def validate_email(self, value):
-        data = self.get_initial()
-        email = data.get('email')
+        """
+        The found user is kept as `user_obj` for the view.
+        """
         try:
-            User.objects.get(email=email)
+            self.user_obj = User.objects.get(email=value)
         except User.DoesNotExist:
             raise ValidationError("User with this email does not exist.")
         return value
@@ -0,0 +1,63 @@
+from accounts.cache import (
+    token_cache,
+    unknown_emails,
+)
+from accounts.models import (
+    Token,
+    User,
+)
+from accounts.signing import invalidate_user_state
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
+from django.dispatch import receiver
+
+
+# The user fields held by the token cache and the signed token user state.
+CACHED_USER_FIELDS = {'email', 'is_active', 'is_admin', 'is_superuser', 'token_generation'}
+
+
+def changes_cached_fields(update_fields):
+    return update_fields is None or bool(CACHED_USER_FIELDS.intersection(update_fields))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, created=False, **kwargs):
+    """
+    Drops the cached token on logout or deletion.
+    """
+    if created:
+        return
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Drops the cached tokens of a user, whose flags could have changed.
+    """
+    if created or not token_cache.enabled or not changes_cached_fields(update_fields):
+        return
+    keys = list(Token.objects.active(instance).values_list('key', flat=True))
+    if keys:
+        token_cache.delete_many(keys)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_signed_state(sender, instance, update_fields=None, **kwargs):
+    """
+    Drops the cached user state used by the signed token authentication.
+    """
+    if changes_cached_fields(update_fields):
+        invalidate_user_state(instance.id)
+
+
+@receiver(post_save, sender=User)
+def discard_unknown_email(sender, instance, created, **kwargs):
+    """
+    Lets a new (or renamed) user log in without waiting for the unknown email cache.
+    """
+    unknown_emails.discard(instance.email)
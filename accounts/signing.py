@@ -0,0 +1,110 @@
+from accounts.cache import (
+    build_instance,
+    CompactUser,
+)
+from accounts.models import User
+from collections import namedtuple
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signing import Signer
+from django.db.models import F
+import time
+
+
+signer = Signer(salt='accounts.signing.SignedToken')
+
+
+class SignedToken(namedtuple('SignedToken', ['user_id', 'issued', 'expires', 'generation'])):
+    """
+    Self-describing HMAC-signed token, verifiable without a database query. The token is valid while
+    its generation matches the user's token generation, so it is revoked by bumping the generation.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, user):
+        issued = int(time.time())
+        expires = issued + int(settings.TOKEN_EXPIRATION_TIME.total_seconds())
+        return cls(user.id, issued, expires, user.token_generation)
+
+    @classmethod
+    def from_string(cls, value):
+        """
+        Raises BadSignature or ValueError for an invalid value.
+        """
+        fields = signer.unsign(value).split('.')
+        if len(fields) != len(cls._fields):
+            raise ValueError('Invalid signed token.')
+        return cls(*[int(field) for field in fields])
+
+    def __str__(self):
+        return signer.sign('.'.join(str(field) for field in self))
+
+    @property
+    def key(self):
+        return str(self)
+
+    @property
+    def is_expired(self):
+        return self.expires < time.time()
+
+
+class UserState(namedtuple('UserState', ['generation', 'email', 'is_active', 'is_admin', 'is_superuser'])):
+    """
+    The user's token generation and flags, held in cache for the signed token authentication.
+    """
+    __slots__ = ()
+
+    def get_user(self, user_id):
+        if getattr(settings, 'TOKEN_COMPACT_USER', False):
+            return CompactUser(user_id, self.email, self.is_active, self.is_admin, self.is_superuser)
+        return build_instance(User, {
+            'id': user_id,
+            'email': self.email,
+            'is_active': self.is_active,
+            'is_admin': self.is_admin,
+            'is_superuser': self.is_superuser,
+            'token_generation': self.generation,
+        })
+
+
+def get_state_cache():
+    return caches[getattr(settings, 'TOKEN_CACHE_ALIAS', None) or 'default']
+
+
+def get_state_key(user_id):
+    return 'accounts:user-state:%s' % user_id
+
+
+def get_user_state(user_id):
+    """
+    Returns the cached UserState, loading it from the database on a cache miss, or None for
+    a deleted user. The state is cached for TOKEN_CACHE_TIMEOUT and filled with add(), so a concurrent
+    revocation isn't undone by a state read before it.
+    """
+    cache = get_state_cache()
+    state = cache.get(get_state_key(user_id))
+    if state is None:
+        values = User.objects.filter(id=user_id).values_list(
+            'token_generation', 'email', 'is_active', 'is_admin', 'is_superuser').first()
+        if values is None:
+            return None
+        state = UserState(*values)
+        cache.add(get_state_key(user_id), state, getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300))
+    return state
+
+
+def invalidate_user_state(user_id):
+    get_state_cache().delete(get_state_key(user_id))
+
+
+def invalidate_user_states(user_ids):
+    get_state_cache().delete_many([get_state_key(user_id) for user_id in user_ids])
+
+
+def revoke_signed_tokens(user_id):
+    """
+    Revokes all signed tokens of the user.
+    """
+    User.objects.filter(id=user_id).update(token_generation=F('token_generation') + 1)
+    invalidate_user_state(user_id)
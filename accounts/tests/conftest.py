@@ -1,5 +1,6 @@
 import factory
 import pytest
+from accounts.throttling import local_counter
 from .tests_factories import UserFactory
 
 
@@ -70,3 +71,8 @@ def fixture_user_inactive():
 def fixture_user_admin():
     user_obj = UserFactory(**_USER_ADMIN)
     return user_obj
+
+
+@pytest.fixture(autouse=True)
+def clear_throttle_counters():
+    local_counter.clear()
@@ -1,3 +1,22 @@
+from accounts.authentication import AccountActivationTokenGenerator
+from accounts.bulk import bulk_update_users
+from accounts.hashers import (
+    get_executor,
+    HashingUnavailable,
+    make_passwords,
+    PasswordHashingExecutor,
+)
+from accounts.imports import (
+    csv_rows,
+    import_users,
+    ndjson_rows,
+)
+from accounts.mail import (
+    get_email_templates,
+    html_to_text,
+    render_email,
+    render_emails,
+)
 from accounts.models import (
     Token,
     User,
@@ -7,15 +26,33 @@ from accounts.serializers import (
     AdminUserRetrieveUpdateSerializer,
     UserRetrieveUpdateSerializer,
 )
+from accounts.throttling import (
+    CacheSlidingWindowCounter,
+    LocalSlidingWindowCounter,
+)
 from .conftest import (
     _DEFAULT_PASSWORD,
     _USER,
     _USER_ADMIN,
+    _USER_INACTIVE,
     _USER_NEW,
 )
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
+import copy
+import csv
+import factory
+import io
+import json
 import pytest
 from rest_framework.status import (
     HTTP_200_OK,
@@ -24,9 +61,12 @@ from rest_framework.status import (
     HTTP_400_BAD_REQUEST,
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
+    HTTP_429_TOO_MANY_REQUESTS,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 from rest_framework.test import APITestCase
 from .tests_factories import UserFactory
+from unittest import mock
 
 
 @pytest.mark.usefixtures('fixture_user')
@@ -47,11 +87,13 @@ class TestsUserAnonymous(APITestCase):
             'email': _USER['email'],
             'password': _DEFAULT_PASSWORD,
         }
+        updated = User.objects.get(email=_USER['email']).updated
         response = self.client.post('/api/accounts/login/', data=data)
         user_obj = User.objects.get(email=_USER['email'])
         token, created = Token.objects.get_or_create(user=user_obj)
         self.assertEqual(response.data['token'], token.key)
         self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertGreater(user_obj.updated, updated)
 
     def test_user_login_invalid_password(self):
         """ test POST: /api/accounts/login/ - Invalid password."""
@@ -91,8 +133,10 @@ class TestsUserAnonymous(APITestCase):
         }
         response = self.client.put('/api/accounts/user/password-reset/%s/%s/' % (uid, token), data=data)
         self.assertEqual(response.status_code, HTTP_200_OK)
+        updated = user_obj.updated
         user_obj = User.objects.get(email=_USER['email'])
         self.assertEqual(user_obj.check_password(new_password), True)
+        self.assertGreater(user_obj.updated, updated)
 
     def test_user_register(self):
         """ test POST: /api/accounts/register/ """
@@ -182,6 +226,7 @@ class TestsUserDefault(APITestCase):
         self.assertEqual(response.status_code, HTTP_200_OK)
         user_obj = User.objects.get(email=_USER['email'])
         self.assertEqual(user_obj.check_password(new_password), True)
+        self.assertGreater(user_obj.updated, self.user_obj.updated)
 
     def test_password_change_required_fields(self):
         """ test PUT: /api/accounts/user/password-change/ - Required fields."""
@@ -282,11 +327,13 @@ class TestsUserAdmin(APITestCase):
 
     def test_get_all_users_by_admin(self):
         """ test GET: /api/accounts/users/ """
-        users_obj = User.objects.all()
+        users_obj = User.objects.order_by('date_joined', 'id')
         serializer = AdminUserListCreateSerializer(users_obj, many=True)
         response = self.client.get('/api/accounts/users/')
         self.assertEqual(response.status_code, HTTP_200_OK)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNone(response.data['previous'])
 
     def test_get_user_by_admin(self):
         """ test GET: /api/accounts/users/<user_id>/ """
@@ -371,3 +418,736 @@ class TestsUserAdmin(APITestCase):
         user_obj = User.objects.get(email=_USER_NEW['email'])
         self.assertNotEqual(user_obj, None)
         self.assertEqual(user_obj.first_name, _USER_NEW['first_name'])
+
+
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsPasswordHashing(APITestCase):
+    """
+    Tests for the number of password hash verifications, the most CPU-expensive operation.
+    """
+    def login(self, email, password):
+        verify = PBKDF2PasswordHasher.verify
+        with mock.patch.object(PBKDF2PasswordHasher, 'verify', autospec=True, side_effect=verify) as verify_mock:
+            response = self.client.post('/api/accounts/login/', data={'email': email, 'password': password})
+        return response, verify_mock.call_count
+
+    def test_user_login_single_verification(self):
+        response, verifications = self.login(_USER['email'], _DEFAULT_PASSWORD)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(verifications, 1)
+
+    def test_user_login_invalid_password_single_verification(self):
+        response, verifications = self.login(_USER['email'], _DEFAULT_PASSWORD + "InvalidPassword")
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertEqual(verifications, 1)
+
+    def test_user_login_inactive_single_verification(self):
+        response, verifications = self.login(_USER_INACTIVE['email'], _DEFAULT_PASSWORD)
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        self.assertEqual(verifications, 1)
+
+
+@pytest.mark.usefixtures('fixture_user')
+@override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_TIMEOUT=0)
+class TestsPasswordHashingExecutor(APITestCase):
+    """
+    Tests for the password hashing process pool.
+    """
+    def test_user_login(self):
+        completed = get_executor().stats()['completed']
+        data = {
+            'email': _USER['email'],
+            'password': _DEFAULT_PASSWORD,
+        }
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        data['password'] += "InvalidPassword"
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertEqual(get_executor().stats()['completed'], completed + 2)
+
+    def test_user_register(self):
+        data = {
+            "first_name": _USER_NEW['first_name'],
+            "last_name": _USER_NEW['last_name'],
+            "phone_number": _USER_NEW['phone_number'],
+            "email": _USER_NEW['email'],
+            "password": _DEFAULT_PASSWORD,
+            "password_confirm": _DEFAULT_PASSWORD,
+        }
+        response = self.client.post('/api/accounts/register/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        user_obj = User.objects.get(email=_USER_NEW['email'])
+        self.assertEqual(user_obj.check_password(_DEFAULT_PASSWORD), True)
+
+    def test_user_login_no_free_slot(self):
+        executor = get_executor()
+        executor.acquire()
+        try:
+            data = {
+                'email': _USER['email'],
+                'password': _DEFAULT_PASSWORD,
+            }
+            response = self.client.post('/api/accounts/login/', data=data)
+        finally:
+            executor.release(0)
+        self.assertEqual(response.status_code, HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(executor.stats()['rejected'], 1)
+
+    def test_executor_queue(self):
+        executor = PasswordHashingExecutor(workers=1, queue_size=1, timeout=0)
+        executor.acquire()
+        executor.acquire()
+        self.assertEqual(executor.stats()['in_flight'], 2)
+        with self.assertRaises(HashingUnavailable):
+            executor.acquire()
+        executor.release(0)
+        executor.release(0)
+        self.assertEqual(executor.run(len, 'abc'), 3)
+        self.assertEqual(executor.stats()['max_in_flight'], 2)
+        executor.shutdown()
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=5)
+    def test_make_passwords(self):
+        completed = get_executor().stats()['completed']
+        passwords = make_passwords(['first', 'second'])
+        self.assertEqual([User(password=password).check_password(raw)
+                          for password, raw in zip(passwords, ['first', 'second'])], [True, True])
+        self.assertEqual(get_executor().stats()['completed'], completed + 2)
+
+
+@pytest.mark.usefixtures('fixture_user')
+@override_settings(LOGIN_UNKNOWN_EMAIL_CACHE_SIZE=100)
+class TestsLoginUnknownEmail(APITestCase):
+    """
+    Tests for the login with an unknown email.
+    """
+    def login(self, email):
+        return self.client.post('/api/accounts/login/', data={'email': email, 'password': _DEFAULT_PASSWORD})
+
+    def test_repeated_unknown_email_without_queries(self):
+        with self.assertNumQueries(1):
+            response = self.login(_USER_NEW['email'])
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        with self.assertNumQueries(0):
+            response = self.login(_USER_NEW['email'])
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_registered_email(self):
+        response = self.login(_USER_NEW['email'])
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        UserFactory(email=_USER_NEW['email'], password=factory.PostGenerationMethodCall('set_password',
+                                                                                         _DEFAULT_PASSWORD))
+        response = self.login(_USER_NEW['email'])
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    @override_settings(LOGIN_DUMMY_HASH=True)
+    def test_unknown_email_dummy_hash(self):
+        encode = PBKDF2PasswordHasher.encode
+        with mock.patch.object(PBKDF2PasswordHasher, 'encode', autospec=True, side_effect=encode) as encode_mock:
+            response = self.login(_USER_NEW['email'])
+            self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+            response = self.login(_USER_NEW['email'])
+            self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertEqual(encode_mock.call_count, 2)
+        invalid_response = self.client.post('/api/accounts/login/',
+                                            data={'email': _USER['email'], 'password': 'invalid'})
+        self.assertEqual(invalid_response.status_code, HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data, invalid_response.data)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates))
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsThrottling(APITestCase):
+    """
+    Tests for the throttling of the login, password reset and registration endpoints.
+    """
+    def login(self, email=_USER['email'], remote_addr='127.0.0.1'):
+        return self.client.post('/api/accounts/login/', data={'email': email, 'password': _DEFAULT_PASSWORD},
+                                REMOTE_ADDR=remote_addr)
+
+    @throttle_rates(login_ip='2/min')
+    def test_login_ip_throttle(self):
+        for _ in range(2):
+            self.assertEqual(self.login().status_code, HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.login()
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login(remote_addr='127.0.0.2').status_code, HTTP_200_OK)
+
+    @throttle_rates(login_email='2/min')
+    def test_login_email_throttle(self):
+        for remote_addr in ('127.0.0.1', '127.0.0.2'):
+            self.assertEqual(self.login(remote_addr=remote_addr).status_code, HTTP_200_OK)
+        response = self.login(email=' %s ' % _USER['email'].upper(), remote_addr='127.0.0.3')
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login(email=_USER_NEW['email']).status_code, HTTP_403_FORBIDDEN)
+
+    @throttle_rates(login_email='2/min')
+    def test_login_email_throttle_invalid_body(self):
+        response = self.client.post('/api/accounts/login/', data=[1, 2], format='json')
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    @throttle_rates(password_reset_email='1/min')
+    def test_password_reset_email_throttle(self):
+        response = self.client.post('/api/accounts/user/password-reset/', data={'email': _USER['email']})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        response = self.client.post('/api/accounts/user/password-reset/', data={'email': _USER['email']})
+        self.assertEqual(response.status_code, HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates()
+    def test_no_rate(self):
+        for _ in range(5):
+            self.assertEqual(self.login().status_code, HTTP_200_OK)
+
+
+class TestsSlidingWindowCounter(APITestCase):
+    """
+    Tests for the sliding window throttle counters.
+    """
+    def assert_sliding_window(self, counter):
+        self.assertEqual(counter.hit('key', 2, 60, now=0), (True, 0))
+        self.assertEqual(counter.hit('key', 2, 60, now=30), (True, 0))
+        self.assertEqual(counter.hit('key', 2, 60, now=45), (False, 15))
+        self.assertEqual(counter.hit('other', 2, 60, now=45), (True, 0))
+        # Half of the previous window counts at the middle of the next one.
+        self.assertEqual(counter.hit('key', 2, 60, now=60), (False, 30))
+        self.assertEqual(counter.hit('key', 2, 60, now=90), (True, 0))
+        self.assertEqual(counter.hit('key', 2, 60, now=100)[0], False)
+        self.assertEqual(counter.hit('key', 2, 60, now=180), (True, 0))
+
+    def test_local_counter(self):
+        self.assert_sliding_window(LocalSlidingWindowCounter())
+
+    def test_cache_counter(self):
+        cache.clear()
+        self.assert_sliding_window(CacheSlidingWindowCounter('default'))
+
+
+class TestsEmailRendering(APITestCase):
+    """
+    Tests for the email template rendering.
+    """
+    def test_render_email(self):
+        context = {'first_name': 'Mark', 'activate_url': 'http://example.com/activate/'}
+        html_message, text_message = render_email('accounts/activate_account', context)
+        self.assertIn('<a href="http://example.com/activate/">', html_message)
+        self.assertNotIn('<', text_message)
+        self.assertIn('Hi Mark,', text_message)
+        self.assertIn('http://example.com/activate/', text_message)
+
+    def test_text_not_escaped(self):
+        context = {'first_name': "O'Brien & Co", 'activate_url': 'http://example.com/activate/?a=1&b=2'}
+        html_message, text_message = render_email('accounts/activate_account', context)
+        self.assertIn('Hi O\'Brien & Co,', text_message)
+        self.assertIn('http://example.com/activate/?a=1&b=2', text_message)
+        self.assertIn('O&#39;Brien &amp; Co', html_message)
+
+    def test_templates_looked_up_once_per_batch(self):
+        contexts = [{'first_name': 'User %s' % i, 'password_reset_url': 'http://example.com/%s/' % i}
+                    for i in range(3)]
+        with mock.patch('accounts.mail.get_template', wraps=get_template) as get_template_mock:
+            rendered = render_emails('accounts/password_reset', contexts)
+        self.assertEqual(get_template_mock.call_count, 2)
+        self.assertEqual([text_message.splitlines()[0] for _, text_message in rendered],
+                         ['Hi User 0,', 'Hi User 1,', 'Hi User 2,'])
+
+    def test_templates_compiled_once_with_cached_loader(self):
+        templates = copy.deepcopy(settings.TEMPLATES)
+        templates[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)]
+        with override_settings(TEMPLATES=templates):
+            html_template, text_template = get_email_templates('accounts/password_reset')
+            self.assertIs(get_email_templates('accounts/password_reset')[0].template, html_template.template)
+        self.assertIsNot(get_email_templates('accounts/password_reset')[0].template, html_template.template)
+
+    def test_html_to_text(self):
+        self.assertEqual(html_to_text('<p>\n  Hi <b>Mark &amp; Co</b>,\n</p>\n<p></p>\n\n\n<p>Thanks</p>'),
+                         'Hi Mark & Co,\n\nThanks')
+
+    def test_password_reset_email_parts(self):
+        UserFactory(**_USER)
+        response = self.client.post('/api/accounts/user/password-reset/', data={'email': _USER['email']})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        message = mail.outbox[0]
+        self.assertNotIn('<p>', message.body)
+        self.assertEqual(message.alternatives[0][1], 'text/html')
+        self.assertIn('<p>', message.alternatives[0][0])
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsQueryCounts(APITestCase):
+    """
+    Pins the number of database queries of every endpoint.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+
+    def authenticate(self, user_obj):
+        token = Token.objects.create(user=user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def test_login(self):
+        # User, last_login update, token.
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/accounts/login/',
+                                        data={'email': _USER['email'], 'password': _DEFAULT_PASSWORD})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_logout(self):
+        self.authenticate(self.user_obj)
+        # Token authentication, token logout.
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/accounts/logout/')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_register(self):
+        data = {
+            'email': _USER_NEW['email'],
+            'first_name': _USER_NEW['first_name'],
+            'last_name': _USER_NEW['last_name'],
+            'password': _DEFAULT_PASSWORD,
+            'password_confirm': _DEFAULT_PASSWORD,
+        }
+        # Unique email validation, user insert.
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/accounts/register/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_activate(self):
+        user_obj = User.objects.get(email=_USER_INACTIVE['email'])
+        uid = urlsafe_base64_encode(force_bytes(user_obj.id)).decode("utf-8")
+        token = AccountActivationTokenGenerator().make_token(user_obj)
+        # User, is_active update.
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/accounts/user/activate/%s/%s/' % (uid, token))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertGreater(User.objects.get(id=user_obj.id).updated, user_obj.updated)
+
+    def test_password_change(self):
+        self.authenticate(self.user_obj)
+        data = {
+            'password': _DEFAULT_PASSWORD,
+            'password_new': 'UserNewPassword#123',
+            'password_new_confirm': 'UserNewPassword#123',
+        }
+        # Token authentication, password update.
+        with self.assertNumQueries(2):
+            response = self.client.put('/api/accounts/user/password-change/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_password_reset(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/accounts/user/password-reset/', data={'email': _USER['email']})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_password_reset_token(self):
+        uid = urlsafe_base64_encode(force_bytes(self.user_obj.id)).decode("utf-8")
+        token = PasswordResetTokenGenerator().make_token(self.user_obj)
+        data = {
+            'password_new': 'UserNewPassword#123',
+            'password_new_confirm': 'UserNewPassword#123',
+        }
+        # User, password update.
+        with self.assertNumQueries(2):
+            response = self.client.put('/api/accounts/user/password-reset/%s/%s/' % (uid, token), data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_user_list(self):
+        self.authenticate(self.admin_obj)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/users/')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_user_create(self):
+        self.authenticate(self.admin_obj)
+        data = {
+            'email': _USER_NEW['email'],
+            'first_name': _USER_NEW['first_name'],
+            'last_name': _USER_NEW['last_name'],
+            'password': _DEFAULT_PASSWORD,
+            'password_confirm': _DEFAULT_PASSWORD,
+        }
+        # Token authentication, unique email validation, user insert.
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/accounts/users/', data=data)
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+
+    def test_user_retrieve(self):
+        self.authenticate(self.user_obj)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_user_update(self):
+        self.authenticate(self.user_obj)
+        # Token authentication, user, user update.
+        with self.assertNumQueries(3):
+            response = self.client.patch('/api/accounts/users/%s/' % self.user_obj.id,
+                                         data={'first_name': _USER_NEW['first_name']})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_user_export(self):
+        self.authenticate(self.admin_obj)
+        # Token authentication, one range query for the single chunk of users.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/accounts/users/export/')
+            b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_user_import(self):
+        self.authenticate(self.admin_obj)
+        content = '\n'.join(json.dumps({
+            'email': 'imported%s@example.com' % i,
+            'first_name': _USER_NEW['first_name'],
+            'last_name': _USER_NEW['last_name'],
+            'password': _DEFAULT_PASSWORD,
+            'password_confirm': _DEFAULT_PASSWORD,
+        }) for i in range(5))
+        # Token authentication, duplicates query and users insert, in a savepoint.
+        with self.assertNumQueries(5):
+            response = self.client.generic('POST', '/api/accounts/users/import/', content, 'application/x-ndjson')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['created'], 5)
+
+    def test_user_bulk_update(self):
+        for user_obj in User.objects.exclude(id=self.admin_obj.id):
+            Token.objects.create(user=user_obj)
+        self.authenticate(self.admin_obj)
+        # Token authentication, tokens and users updated through subqueries, in a savepoint.
+        with self.assertNumQueries(5):
+            response = self.client.patch('/api/accounts/users/bulk-update/?is_admin=false',
+                                         data={'is_active': False}, format='json')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+class TestsUserListPagination(APITestCase):
+    """
+    Tests for the cursor pagination of the user list.
+    """
+    def setUp(self):
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+        token = Token.objects.create(user=self.admin_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        # Users joined at the same time are ordered by id.
+        date_joined = timezone.now()
+        User.objects.bulk_create([User(email='user%s@example.com' % i, date_joined=date_joined) for i in range(6)])
+        self.emails = list(User.objects.order_by('date_joined', 'id').values_list('email', flat=True))
+
+    def get_page(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.data, [user['email'] for user in response.data['results']]
+
+    def test_pages(self):
+        pages = []
+        url = '/api/accounts/users/?page_size=3'
+        while url:
+            data, emails = self.get_page(url)
+            pages.append(emails)
+            url = data['next']
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.emails)
+
+        data, emails = self.get_page(data['previous'])
+        self.assertEqual(emails, pages[1])
+        data, emails = self.get_page(data['previous'])
+        self.assertEqual(emails, pages[0])
+        self.assertIsNone(data['previous'])
+        data, emails = self.get_page(data['next'])
+        self.assertEqual(emails, pages[1])
+
+    @override_settings(USERS_PAGE_SIZE=2, USERS_PAGE_MAX_SIZE=4)
+    def test_page_size(self):
+        self.assertEqual(len(self.get_page('/api/accounts/users/')[1]), 2)
+        self.assertEqual(len(self.get_page('/api/accounts/users/?page_size=100')[1]), 4)
+        self.assertEqual(len(self.get_page('/api/accounts/users/?page_size=invalid')[1]), 2)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_page_queries(self):
+        data, emails = self.get_page('/api/accounts/users/?page_size=3')
+        # Token authentication from the cache, one range query for the page.
+        with self.assertNumQueries(1):
+            self.get_page(data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/accounts/users/?cursor=invalid')
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsUserListFilters(APITestCase):
+    """
+    Tests for the filters of the user list.
+    """
+    def setUp(self):
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+        token = Token.objects.create(user=self.admin_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def get_emails(self, query):
+        response = self.client.get('/api/accounts/users/?' + query)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return {user['email'] for user in response.data['results']}
+
+    def test_boolean_filters(self):
+        self.assertEqual(self.get_emails('is_active=false'), {_USER_INACTIVE['email']})
+        self.assertEqual(self.get_emails('is_active=true&is_admin=0'), {_USER['email']})
+        self.assertEqual(self.get_emails('is_admin=true'), {_USER_ADMIN['email']})
+
+    def test_date_ranges(self):
+        User.objects.filter(email=_USER['email']).update(date_joined=timezone.now() - timedelta(days=10),
+                                                          last_login=timezone.now() - timedelta(days=1))
+        before = (timezone.now() - timedelta(days=5)).date().isoformat()
+        self.assertEqual(self.get_emails('date_joined_before=' + before), {_USER['email']})
+        self.assertNotIn(_USER['email'], self.get_emails('date_joined_after=' + before))
+        self.assertEqual(self.get_emails('last_login_after=' + before), {_USER['email']})
+
+    def test_search(self):
+        self.assertEqual(self.get_emails('search=user'), {_USER['email'], _USER_INACTIVE['email']})
+        self.assertEqual(self.get_emails('search=' + _USER_ADMIN['last_name'][:3]), {_USER_ADMIN['email']})
+        self.assertEqual(self.get_emails('search=nobody'), set())
+
+    def test_invalid_filters(self):
+        for query in ('is_active=maybe', 'date_joined_after=yesterday', 'last_login_before=2018-13-01'):
+            response = self.client.get('/api/accounts/users/?' + query)
+            self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsUserExport(APITestCase):
+    """
+    Tests for the streaming user export.
+    """
+    def setUp(self):
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+        token = Token.objects.create(user=self.admin_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def export(self, query=''):
+        response = self.client.get('/api/accounts/users/export/' + query)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        expected = AdminUserListCreateSerializer(User.objects.order_by('date_joined', 'id'), many=True).data
+        self.assertEqual([json.loads(line) for line in content.splitlines()], [dict(user) for user in expected])
+
+    def test_export_csv(self):
+        response, content = self.export('?export_format=csv&is_active=false')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['email'] for row in rows], [_USER_INACTIVE['email']])
+        self.assertNotIn('password', rows[0])
+        self.assertEqual(rows[0]['last_login'], '')
+
+    @override_settings(USERS_EXPORT_CHUNK_SIZE=2)
+    def test_export_in_chunks(self):
+        User.objects.bulk_create([User(email='user%s@example.com' % i) for i in range(3)])
+        response = self.client.get('/api/accounts/users/export/')
+        # 6 users in chunks of 2, the last chunk being empty.
+        with self.assertNumQueries(4):
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 6)
+
+    def test_export_invalid_format(self):
+        response = self.client.get('/api/accounts/users/export/?export_format=xml')
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_export_by_user(self):
+        user_obj = User.objects.get(email=_USER['email'])
+        token = Token.objects.create(user=user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response = self.client.get('/api/accounts/users/export/')
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user')
+class TestsUserImport(APITestCase):
+    """
+    Tests for the bulk user import.
+    """
+    def setUp(self):
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+        token = Token.objects.create(user=self.admin_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def row(self, email, **fields):
+        return dict({'email': email, 'first_name': 'Imported', 'last_name': 'User',
+                     'password': _DEFAULT_PASSWORD, 'password_confirm': _DEFAULT_PASSWORD}, **fields)
+
+    def post(self, content, query='', content_type='application/x-ndjson'):
+        return self.client.generic('POST', '/api/accounts/users/import/' + query, content, content_type)
+
+    def test_import_ndjson(self):
+        lines = [
+            json.dumps(self.row('imported1@example.com', is_active=True)),
+            json.dumps(self.row('not an email')),
+            '',
+            json.dumps(self.row(_USER['email'])),
+            '{"email": ',
+            json.dumps(self.row('imported2@example.com')),
+            json.dumps(self.row('imported1@example.com')),
+            json.dumps(self.row('imported3@example.com', password_confirm='other')),
+        ]
+        response = self.post('\n'.join(lines))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 5)
+        self.assertEqual([(error['row'], sorted(error['errors'])) for error in response.data['errors']], [
+            (2, ['email']), (3, ['email']), (4, ['non_field_errors']), (6, ['email']), (7, ['password_confirm']),
+        ])
+        user_obj = User.objects.get(email='imported1@example.com')
+        self.assertEqual(user_obj.is_active, True)
+        self.assertEqual(user_obj.check_password(_DEFAULT_PASSWORD), True)
+        self.assertEqual(User.objects.get(email='imported2@example.com').is_active, False)
+
+    def test_import_csv(self):
+        content = io.StringIO()
+        writer = csv.DictWriter(content, ('email', 'first_name', 'last_name', 'phone_number', 'is_admin',
+                                          'password', 'password_confirm'))
+        writer.writeheader()
+        writer.writerow(self.row('imported1@example.com', phone_number='', is_admin='true'))
+        writer.writerow(self.row('imported2@example.com', phone_number='+999999999', is_admin='false'))
+        response = self.post(content.getvalue(), '?import_format=csv', 'text/csv')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(User.objects.get(email='imported1@example.com').is_admin, True)
+        self.assertEqual(User.objects.get(email='imported2@example.com').phone_number, '+999999999')
+
+    def test_import_queries(self):
+        lines = [json.dumps(self.row('imported%s@example.com' % i)) for i in range(5)]
+        # The duplicates query and the insert of each of the 3 chunks, in a savepoint.
+        with self.assertNumQueries(12):
+            result = import_users(ndjson_rows(lines), chunk_size=2)
+        self.assertEqual(result.created, 5)
+
+    def test_import_csv_rows(self):
+        rows = list(csv_rows(['email,first_name,phone_number\n', 'user@example.com,,\n']))
+        self.assertEqual(rows, [(1, {'email': 'user@example.com'})])
+
+    def test_imported_user_login(self):
+        data = {'email': 'imported@example.com', 'password': _DEFAULT_PASSWORD}
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        self.post(json.dumps(self.row(data['email'], is_active=True)))
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    def test_import_invalid_format(self):
+        response = self.post('', '?import_format=xml')
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+
+    def test_import_by_user(self):
+        user_obj = User.objects.get(email=_USER['email'])
+        token = Token.objects.create(user=user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response = self.post(json.dumps(self.row('imported@example.com')))
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        self.assertEqual(User.objects.filter(email='imported@example.com').exists(), False)
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsUserBulkUpdate(APITestCase):
+    """
+    Tests for the bulk user update.
+    """
+    def setUp(self):
+        self.admin_obj = User.objects.get(email=_USER_ADMIN['email'])
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.admin_token = Token.objects.create(user=self.admin_obj)
+
+    def bulk_update(self, data, query=''):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.admin_token.key)
+        return self.client.patch('/api/accounts/users/bulk-update/' + query, data=data, format='json')
+
+    def get_user(self, key, keyword='Token'):
+        self.client.credentials(HTTP_AUTHORIZATION=keyword + ' ' + key)
+        return self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+
+    def test_deactivate_by_ids(self):
+        token = Token.objects.create(user=self.user_obj)
+        self.assertEqual(self.get_user(token.key).status_code, HTTP_200_OK)
+        response = self.bulk_update({'ids': [self.user_obj.id], 'is_active': False})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data, {'updated': 1, 'revoked_tokens': 1})
+        self.assertEqual(User.objects.get(id=self.user_obj.id).is_active, False)
+        self.assertEqual(Token.objects.get(key=token.key).logout, True)
+        # The cached token state is dropped.
+        self.assertEqual(self.get_user(token.key).status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_update_by_filters(self):
+        token = Token.objects.create(user=self.user_obj)
+        self.assertEqual(self.get_user(token.key).status_code, HTTP_200_OK)
+        response = self.bulk_update({'is_admin': True, 'revoke_tokens': False}, '?search=' + _USER['email'])
+        self.assertEqual(response.data, {'updated': 1, 'revoked_tokens': 0})
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        response = self.client.get('/api/accounts/users/')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+
+    @override_settings(SIGNED_TOKENS=True)
+    def test_revoke_signed_tokens(self):
+        response = self.client.post('/api/accounts/login/', data={'email': _USER['email'],
+                                                                  'password': _DEFAULT_PASSWORD})
+        key = response.data['token']
+        self.assertEqual(self.get_user(key, 'Bearer').status_code, HTTP_200_OK)
+        self.bulk_update({'is_superuser': False}, '?is_active=true&is_admin=false')
+        self.assertEqual(self.get_user(key, 'Bearer').status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_bulk_update_queries(self):
+        users = [User(email='user%s@example.com' % i, is_active=True) for i in range(20)]
+        User.objects.bulk_create(users)
+        queryset = User.objects.filter(email__startswith='user')
+        for user_obj in queryset:
+            Token.objects.create(user=user_obj)
+        # The tokens and the users updated through subqueries, in a savepoint.
+        with self.assertNumQueries(4):
+            result = bulk_update_users(queryset, {'is_active': False})
+        self.assertEqual((result.updated, result.revoked_tokens), (22, 22))
+        self.assertEqual(User.objects.filter(email__startswith='user', is_active=True).exists(), False)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default', SIGNED_TOKENS=True)
+    def test_bulk_update_queries_with_caches(self):
+        queryset = User.objects.filter(email=_USER['email'])
+        Token.objects.create(user=self.user_obj)
+        # The token keys and the user ids read for the cache invalidation.
+        with self.assertNumQueries(6):
+            result = bulk_update_users(queryset, {'is_active': False})
+        self.assertEqual((result.updated, result.revoked_tokens), (1, 1))
+
+    def test_grant_keeps_tokens(self):
+        token = Token.objects.create(user=self.user_obj)
+        response = self.bulk_update({'ids': [self.user_obj.id], 'is_admin': True})
+        self.assertEqual(response.data, {'updated': 1, 'revoked_tokens': 0})
+        self.assertEqual(self.get_user(token.key).status_code, HTTP_200_OK)
+        response = self.bulk_update({'ids': [self.user_obj.id], 'is_admin': True, 'revoke_tokens': True})
+        self.assertEqual(response.data, {'updated': 1, 'revoked_tokens': 1})
+
+    def test_bulk_update_invalid(self):
+        response = self.bulk_update({'is_active': False})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        response = self.bulk_update({'ids': [self.user_obj.id]})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(User.objects.get(id=self.user_obj.id).is_active, True)
+
+    def test_bulk_update_by_user(self):
+        self.admin_token = Token.objects.create(user=self.user_obj)
+        response = self.bulk_update({'ids': [self.user_obj.id], 'is_active': False})
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
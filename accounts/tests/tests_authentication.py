@@ -0,0 +1,501 @@
+from accounts.authentication import (
+    ExpiringTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from accounts.cache import (
+    CompactUser,
+    LRUCache,
+    token_cache,
+)
+from accounts.checks import check_signed_tokens_cache
+from accounts.models import (
+    Token,
+    User,
+)
+from accounts.permissions import (
+    IsAdmin,
+    IsAuthenticatedAndActive,
+    IsOwnerOrAdmin,
+)
+from accounts.principal import (
+    ANONYMOUS,
+    get_principal,
+)
+from accounts.tokens import (
+    issue_token,
+    TokenTouchBuffer,
+)
+from accounts.signing import (
+    get_state_cache,
+    get_state_key,
+    SignedToken,
+)
+from .conftest import (
+    _DEFAULT_PASSWORD,
+    _USER,
+)
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+)
+from django.utils import timezone
+import pytest
+from rest_framework.exceptions import (
+    AuthenticationFailed,
+    PermissionDenied,
+)
+from rest_framework.status import (
+    HTTP_200_OK,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_403_FORBIDDEN,
+)
+from rest_framework.request import Request
+from rest_framework.test import (
+    APIRequestFactory,
+    APITestCase,
+)
+from unittest import mock
+
+
+def _token_updates(queries):
+    return [query for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE') and 'accounts_token' in query['sql']]
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsTokenTouch(APITestCase):
+    """
+    Tests for the token sliding expiration writes.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.token = Token.objects.create(user=self.user_obj)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=timedelta(minutes=1))
+    def test_fresh_token_is_not_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(len(_token_updates(queries)), 0)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=timedelta(minutes=1))
+    def test_stale_token_is_written(self):
+        stale = timezone.now() - timedelta(minutes=5)
+        Token.objects.filter(key=self.token.key).update(updated=stale)
+        with CaptureQueriesContext(connection) as queries:
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(len(_token_updates(queries)), 1)
+        self.assertGreater(Token.objects.get(key=self.token.key).updated, stale)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=None)
+    def test_token_is_written_without_refresh_interval(self):
+        with CaptureQueriesContext(connection) as queries:
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(len(_token_updates(queries)), 2)
+
+    def test_touch_buffer_flushes_with_one_update(self):
+        tokens = [self.token] + [Token.objects.create(user=self.user_obj) for _ in range(4)]
+        now = timezone.now() + timedelta(minutes=1)
+        touch_buffer = TokenTouchBuffer()
+        for token in tokens * 3:
+            touch_buffer.touch(token.key, now)
+        self.assertEqual(len(touch_buffer), len(tokens))
+        with CaptureQueriesContext(connection) as queries:
+            rows = touch_buffer.flush()
+        self.assertEqual(len(_token_updates(queries)), 1)
+        self.assertEqual(rows, len(tokens))
+        self.assertEqual(len(touch_buffer), 0)
+        self.assertEqual(Token.objects.filter(updated=now).count(), len(tokens))
+
+    def test_touch_buffer_keeps_touch_times(self):
+        tokens = [self.token] + [Token.objects.create(user=self.user_obj) for _ in range(2)]
+        now = timezone.now()
+        times = [now + timedelta(minutes=i + 1) for i in range(len(tokens))]
+        touch_buffer = TokenTouchBuffer()
+        for token, when in zip(tokens, times):
+            touch_buffer.touch(token.key, when)
+        Token.objects.filter(key=tokens[0].key).update(updated=now + timedelta(hours=1))
+        with CaptureQueriesContext(connection) as queries:
+            touch_buffer.flush()
+        self.assertEqual(len(_token_updates(queries)), 1)
+        self.assertEqual([Token.objects.get(key=token.key).updated for token in tokens],
+                         [now + timedelta(hours=1)] + times[1:])
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsTokenPerRequest(APITestCase):
+    """
+    Tests for the token lookup shared by TokenMiddleware and ExpiringTokenAuthentication.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.token = Token.objects.create(user=self.user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=None)
+    def test_token_looked_up_and_touched_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        token_selects = [query for query in queries.captured_queries
+                         if query['sql'].startswith('SELECT') and 'FROM "accounts_token"' in query['sql']]
+        self.assertEqual(len(token_selects), 1)
+        self.assertEqual(len(_token_updates(queries)), 1)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=None)
+    def test_authenticated_request_query_count(self):
+        # token lookup, token touch, user retrieve
+        with self.assertNumQueries(3):
+            self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+
+    def test_invalid_token_rejected_once(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+
+@pytest.mark.usefixtures('fixture_user')
+@override_settings(TOKEN_CACHE_ALIAS='default', TOKEN_CACHE_LOCAL_SIZE=100, TOKEN_REFRESH_INTERVAL=timedelta(minutes=1))
+class TestsTokenCache(APITestCase):
+    """
+    Tests for the read-through token cache.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.token = Token.objects.create(user=self.user_obj)
+        self.authentication = ExpiringTokenAuthentication()
+        self.authentication.authenticate_credentials(self.token.key)
+
+    def test_cache_hit_without_queries(self):
+        with self.assertNumQueries(0):
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+            self.assertEqual(user.id, self.user_obj.id)
+            self.assertEqual(str(user), self.user_obj.email)
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(token.key, self.token.key)
+
+    def test_cache_hit_deferred_fields(self):
+        user, token = self.authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, self.user_obj.first_name)
+
+    def test_logout_invalidates(self):
+        self.token.logout = True
+        self.token.save()
+        self.assertIsNone(token_cache.get(self.token.key))
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_deactivation_invalidates(self):
+        self.user_obj.is_active = False
+        self.user_obj.save()
+        with self.assertRaises(PermissionDenied):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    def test_password_change_invalidates(self):
+        self.user_obj.set_password('UserNewPassword#123')
+        self.user_obj.save()
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    def test_touch_does_not_restore_logged_out_token(self):
+        token = self.authentication.get_token(self.token.key)
+        Token.objects.filter(key=self.token.key).update(logout=True)
+        token_cache.delete(self.token.key)
+        self.authentication.touch(token, timezone.now() + timedelta(minutes=2))
+        self.assertIsNone(token_cache.get(self.token.key))
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(self.token.key)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=None, TOKEN_TOUCH_FLUSH_INTERVAL=timedelta(minutes=1))
+    def test_buffered_touches_keep_cache_hits(self):
+        with mock.patch('accounts.tokens.touch_buffer', TokenTouchBuffer()) as buffer:
+            with mock.patch.object(buffer, 'start'), self.assertNumQueries(0):
+                for _ in range(10):
+                    self.authentication.authenticate_credentials(self.token.key)
+        self.assertGreater(token_cache.get(self.token.key).updated, self.token.updated)
+
+    @override_settings(TOKEN_REFRESH_INTERVAL=None)
+    def test_touches_keep_cache_hits(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(10):
+                self.authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(len(_token_updates(queries)), 10)
+        self.assertEqual(len(queries.captured_queries), 10)
+
+    def test_token_delete_invalidates(self):
+        key = self.token.key
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authentication.authenticate_credentials(key)
+
+
+class TestsLRUCache(APITestCase):
+    """
+    Tests for the in-process LRU tier.
+    """
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, timeout=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, timeout=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+@pytest.mark.usefixtures('fixture_user')
+@override_settings(SIGNED_TOKENS=True)
+class TestsSignedToken(APITestCase):
+    """
+    Tests for the stateless signed tokens.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        data = {
+            'email': _USER['email'],
+            'password': _DEFAULT_PASSWORD,
+        }
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.key = response.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.key)
+
+    def test_login_does_not_create_token(self):
+        self.assertFalse(Token.objects.filter(user=self.user_obj).exists())
+        self.assertEqual(SignedToken.from_string(self.key).user_id, self.user_obj.id)
+
+    def test_authenticate_without_queries(self):
+        SignedTokenAuthentication().authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            user, token = SignedTokenAuthentication().authenticate_credentials(self.key)
+        self.assertEqual(user.id, self.user_obj.id)
+        self.assertEqual(user.email, self.user_obj.email)
+
+    def test_get_user(self):
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['email'], self.user_obj.email)
+
+    def test_logout_revokes(self):
+        response = self.client.post('/api/accounts/logout/')
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_tampered_token(self):
+        token = SignedToken.from_string(self.key)._replace(user_id=self.user_obj.id + 1)
+        value = str(token).rsplit(':', 1)[0]
+        signature = self.key.rsplit(':', 1)[1]
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer %s:%s' % (value, signature))
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token(self):
+        token = SignedToken.from_string(self.key)._replace(expires=0)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(token))
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    def test_inactive_user(self):
+        self.user_obj.is_active = False
+        self.user_obj.save()
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+
+    def test_disabled_rejects_tokens(self):
+        with override_settings(SIGNED_TOKENS=False):
+            response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=-1)
+    def test_user_state_expires(self):
+        SignedTokenAuthentication().authenticate_credentials(self.key)
+        self.assertIsNone(get_state_cache().get(get_state_key(self.user_obj.id)))
+
+    def test_per_process_cache_check(self):
+        self.assertEqual([error.id for error in check_signed_tokens_cache(None)], ['accounts.E001'])
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.memcached.PyLibMCCache'}}
+        with override_settings(CACHES=caches):
+            self.assertEqual(check_signed_tokens_cache(None), [])
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsTokenPolicy(APITestCase):
+    """
+    Tests for the login token reuse and limit.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+
+    def login(self):
+        data = {
+            'email': _USER['email'],
+            'password': _DEFAULT_PASSWORD,
+        }
+        response = self.client.post('/api/accounts/login/', data=data)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        return response.data['token']
+
+    @override_settings(TOKEN_REUSE=True)
+    def test_reuse_token(self):
+        key = self.login()
+        self.assertEqual(self.login(), key)
+        self.assertEqual(Token.objects.filter(user=self.user_obj).count(), 1)
+
+    @override_settings(TOKEN_REUSE=True)
+    def test_reuse_skips_expired_and_logged_out_tokens(self):
+        key = self.login()
+        Token.objects.filter(key=key).update(updated=timezone.now() - timedelta(days=2))
+        second_key = self.login()
+        self.assertNotEqual(second_key, key)
+        Token.objects.filter(key=second_key).update(logout=True)
+        self.assertNotIn(self.login(), (key, second_key))
+
+    @override_settings(TOKEN_MAX_PER_USER=3)
+    def test_max_tokens_per_user(self):
+        keys = [self.login() for _ in range(5)]
+        active = Token.objects.active(self.user_obj).values_list('key', flat=True)
+        self.assertEqual(set(active), set(keys[-3:]))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + keys[0])
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_MAX_PER_USER=2)
+    def test_max_tokens_reads_evicted_keys(self):
+        Token.objects.bulk_create([Token(key='%040d' % i, user=self.user_obj) for i in range(5)])
+        with CaptureQueriesContext(connection) as queries:
+            issue_token(self.user_obj)
+        select = queries.captured_queries[0]['sql']
+        self.assertTrue(select.startswith('SELECT "accounts_token"."key" FROM'))
+        self.assertEqual(Token.objects.active(self.user_obj).count(), 2)
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsPrincipal(APITestCase):
+    """
+    Tests for the request principal read by the permissions.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.token = Token.objects.create(user=self.user_obj)
+
+    def request(self, authorization=None, authenticators=(ExpiringTokenAuthentication(),)):
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        return Request(APIRequestFactory().get('/', **headers), authenticators=authenticators)
+
+    def test_token_principal(self):
+        request = self.request('Token ' + self.token.key)
+        self.assertEqual(request.user.id, self.user_obj.id)
+        with self.assertNumQueries(0):
+            principal = get_principal(request)
+        self.assertEqual((principal.user_id, principal.is_active, principal.is_admin, principal.token_key),
+                         (self.user_obj.id, True, False, self.token.key))
+        self.assertIs(get_principal(request), principal)
+
+    @override_settings(SIGNED_TOKENS=True)
+    def test_signed_token_principal(self):
+        key = str(SignedToken.create(self.user_obj))
+        request = self.request('Bearer ' + key, (ExpiringTokenAuthentication(), SignedTokenAuthentication()))
+        principal = get_principal(request)
+        self.assertEqual((principal.user_id, principal.is_active, principal.is_admin, principal.token_key),
+                         (self.user_obj.id, True, False, key))
+
+    def test_anonymous_principal(self):
+        principal = get_principal(self.request())
+        self.assertIs(principal, ANONYMOUS)
+        self.assertFalse(principal.is_authenticated)
+
+    def test_permissions(self):
+        request = self.request('Token ' + self.token.key)
+        view = mock.Mock(kwargs={'pk': str(self.user_obj.id)})
+        self.assertTrue(IsAuthenticatedAndActive().has_permission(request, view))
+        self.assertFalse(IsAdmin().has_permission(request, view))
+        self.assertTrue(IsOwnerOrAdmin().has_permission(request, view))
+        view.kwargs['pk'] = str(self.user_obj.id + 1)
+        self.assertFalse(IsOwnerOrAdmin().has_permission(request, view))
+        self.assertFalse(IsAuthenticatedAndActive().has_permission(self.request(), view))
+
+
+@pytest.mark.usefixtures('fixture_user')
+@override_settings(TOKEN_COMPACT_USER=True, TOKEN_CACHE_ALIAS='default', TOKEN_REFRESH_INTERVAL=timedelta(minutes=1))
+class TestsCompactUser(APITestCase):
+    """
+    Tests for the compact request user.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+        self.token = Token.objects.create(user=self.user_obj)
+
+    def test_authenticate(self):
+        token_cache.delete(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            user, token = ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn('password', queries.captured_queries[0]['sql'])
+        self.assertIsInstance(user, CompactUser)
+        self.assertEqual((user.id, user.email, user.is_active, user.is_admin), (self.user_obj.id, _USER['email'],
+                                                                                True, False))
+        self.assertEqual(token.key, self.token.key)
+        self.assertEqual(user.pk, self.user_obj.pk)
+        with self.assertNumQueries(0):
+            ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_invalid_token(self):
+        with self.assertRaises(AuthenticationFailed):
+            ExpiringTokenAuthentication().authenticate_credentials('invalid')
+
+    def test_full_user_loaded_once(self):
+        user, _ = ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, _USER['first_name'])
+            self.assertEqual(user.last_name, _USER['last_name'])
+        user.first_name = 'Changed'
+        user.save(update_fields=['first_name'])
+        self.assertEqual(User.objects.get(id=self.user_obj.id).first_name, 'Changed')
+
+    def test_set_compact_attribute(self):
+        user, _ = ExpiringTokenAuthentication().authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user.is_admin = True
+        self.assertTrue(user.is_admin)
+        # The user, its update and its tokens dropped from the token cache.
+        with self.assertNumQueries(3):
+            user.save()
+        self.assertTrue(User.objects.get(id=self.user_obj.id).is_admin)
+
+    def test_get_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get('/api/accounts/users/%s/' % self.user_obj.id)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['email'], _USER['email'])
+
+    def test_password_change(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        password = _DEFAULT_PASSWORD + '1'
+        response = self.client.put('/api/accounts/user/password-change/', data={
+            'password': _DEFAULT_PASSWORD,
+            'password_new': password,
+            'password_new_confirm': password,
+        })
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertTrue(User.objects.get(id=self.user_obj.id).check_password(password))
+
+    @override_settings(SIGNED_TOKENS=True)
+    def test_signed_token(self):
+        key = str(SignedToken.create(self.user_obj))
+        SignedTokenAuthentication().authenticate_credentials(key)
+        with self.assertNumQueries(0):
+            user, _ = SignedTokenAuthentication().authenticate_credentials(key)
+        self.assertIsInstance(user, CompactUser)
+        self.assertEqual(user.id, self.user_obj.id)
@@ -0,0 +1,278 @@
+from accounts.activation import (
+    RateLimiter,
+    resend_activation_emails,
+)
+from accounts.mail import (
+    delivery_stats,
+    send_queued_mail,
+)
+from accounts.models import (
+    OutgoingEmail,
+    Token,
+    User,
+)
+from accounts.tokens import purge_tokens
+from benchmarks.bench_load import percentile
+from .conftest import (
+    _DEFAULT_PASSWORD,
+    _USER,
+    _USER_INACTIVE,
+    _USER_NEW,
+)
+from datetime import timedelta
+from django.conf import settings
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+import csv
+import os
+import pytest
+import re
+import tempfile
+from rest_framework.test import APITestCase
+from unittest import mock
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsPurgeTokens(APITestCase):
+    """
+    Tests for the purge_tokens command.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+
+    def test_purge_tokens(self):
+        valid = [Token.objects.create(user=self.user_obj) for _ in range(3)]
+        logged_out = [Token.objects.create(user=self.user_obj, logout=True) for _ in range(4)]
+        expired = [Token.objects.create(user=self.user_obj) for _ in range(5)]
+        updated = timezone.now() - settings.TOKEN_EXPIRATION_TIME - timedelta(minutes=1)
+        Token.objects.filter(key__in=[token.key for token in expired]).update(updated=updated)
+
+        out = StringIO()
+        call_command('purge_tokens', batch_size=2, stdout=out)
+        self.assertIn('Deleted %s tokens' % (len(logged_out) + len(expired)), out.getvalue())
+        self.assertEqual(set(Token.objects.values_list('key', flat=True)), {token.key for token in valid})
+
+    def test_purge_queries(self):
+        Token.objects.bulk_create([Token(key='%040d' % i, user=self.user_obj, logout=True) for i in range(5)])
+        # Every batch of 2 is selected and deleted by one query each, then the last select finds none.
+        with self.assertNumQueries(7):
+            self.assertEqual(purge_tokens(batch_size=2), 5)
+        self.assertFalse(Token.objects.exists())
+
+
+@pytest.mark.usefixtures('fixture_user_admin')
+@pytest.mark.usefixtures('fixture_user')
+class TestsExportUsers(APITestCase):
+    """
+    Tests for the export_users command.
+    """
+    def test_export_users(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            out = StringIO()
+            call_command('export_users', export_format='csv', output=path, chunk_size=1, stdout=out)
+            self.assertIn('Exported 2 users', out.getvalue())
+            with open(path, newline='') as exported:
+                emails = [row['email'] for row in csv.DictReader(exported)]
+        self.assertEqual(emails, list(User.objects.order_by('date_joined', 'id').values_list('email', flat=True)))
+
+    def test_export_users_stdout(self):
+        out = StringIO()
+        call_command('export_users', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+
+
+@pytest.mark.usefixtures('fixture_user')
+class TestsImportUsers(APITestCase):
+    """
+    Tests for the import_users command.
+    """
+    def test_import_users(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'users.csv')
+            with open(path, 'w', newline='') as users_file:
+                writer = csv.writer(users_file)
+                writer.writerow(('email', 'first_name', 'last_name', 'password', 'password_confirm'))
+                for email in (_USER_NEW['email'], _USER['email'], 'imported@example.com'):
+                    writer.writerow((email, 'Imported', 'User', _DEFAULT_PASSWORD, _DEFAULT_PASSWORD))
+            out, err = StringIO(), StringIO()
+            call_command('import_users', path, import_format='csv', chunk_size=2, stdout=out, stderr=err)
+        self.assertIn('Imported 2 users, 1 rows failed', out.getvalue())
+        self.assertIn('Row 2: email: user with this email already exists.', err.getvalue())
+        self.assertEqual(User.objects.filter(first_name='Imported').count(), 2)
+
+
+@override_settings(EMAIL_OUTBOX=True, EMAIL_OUTBOX_INTERVAL=None)
+@pytest.mark.usefixtures('fixture_user')
+class TestsSendQueuedMail(APITestCase):
+    """
+    Tests for the email outbox and the send_queued_mail command.
+    """
+    def register(self):
+        return self.client.post('/api/accounts/register/', data={
+            'email': _USER_NEW['email'],
+            'first_name': _USER_NEW['first_name'],
+            'last_name': _USER_NEW['last_name'],
+            'password': _DEFAULT_PASSWORD,
+            'password_confirm': _DEFAULT_PASSWORD,
+        })
+
+    def send_queued_mail(self):
+        out = StringIO()
+        call_command('send_queued_mail', stdout=out)
+        return out.getvalue()
+
+    def test_send_queued_mail(self):
+        self.assertEqual(self.register().status_code, 200)
+        response = self.client.post('/api/accounts/user/password-reset/', data={'email': _USER['email']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutgoingEmail.objects.filter(sent__isnull=True).count(), 2)
+
+        self.assertIn('Sent 2 emails, 0 failed, over 1 connections', self.send_queued_mail())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [_USER['email'], _USER_NEW['email']])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(OutgoingEmail.objects.filter(sent__isnull=True).exists())
+        self.assertIn('Sent 0 emails, 0 failed, over 0 connections', self.send_queued_mail())
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=timedelta(minutes=1))
+    def test_retry(self):
+        self.register()
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('Connection refused')):
+            self.assertIn('Sent 0 emails, 1 failed', self.send_queued_mail())
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'Connection refused')
+        self.assertGreater(email.next_attempt, timezone.now())
+        # Not due before the retry delay.
+        self.assertIn('Sent 0 emails, 0 failed, over 0 connections', self.send_queued_mail())
+
+        OutgoingEmail.objects.update(next_attempt=timezone.now())
+        self.assertIn('Sent 1 emails, 0 failed', self.send_queued_mail())
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertIsNotNone(email.sent)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_batches(self):
+        for i in range(5):
+            OutgoingEmail.objects.create(to='user%s@example.com' % i, from_email=settings.DEFAULT_FROM_EMAIL,
+                                         subject='Subject', body='Body')
+        delivery_stats.reset()
+        with mock.patch.object(EmailBackend, 'open', autospec=True) as open_mock:
+            self.assertEqual(send_queued_mail(batch_size=2), (5, 0, 3))
+        self.assertEqual(open_mock.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        stats = delivery_stats.stats()
+        self.assertEqual((stats['sent'], stats['failed'], stats['connections']), (5, 0, 3))
+        self.assertGreater(stats['messages_per_second'], 0)
+
+    def test_reconnect_after_failure(self):
+        for i in range(3):
+            OutgoingEmail.objects.create(to='user%s@example.com' % i, from_email=settings.DEFAULT_FROM_EMAIL,
+                                         subject='Subject', body='Body')
+        send_messages = EmailBackend.send_messages
+        sent = []
+
+        def send_or_fail(backend, messages):
+            if not sent:
+                sent.append(None)
+                raise OSError('Connection lost')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=send_or_fail):
+            self.assertEqual(send_queued_mail(batch_size=10), (2, 1, 2))
+
+
+@pytest.mark.usefixtures('fixture_user_inactive')
+@pytest.mark.usefixtures('fixture_user')
+class TestsResendActivationEmails(APITestCase):
+    """
+    Tests for the resend_activation_emails command.
+    """
+    def setUp(self):
+        User.objects.bulk_create([User(email='inactive%s@example.com' % i, first_name='Inactive') for i in range(4)])
+        self.emails = list(User.objects.filter(is_active=False).order_by('date_joined', 'id').values_list(
+            'email', flat=True))
+
+    def test_resend_activation_emails(self):
+        out = StringIO()
+        with mock.patch.object(EmailBackend, 'open', autospec=True) as open_mock:
+            call_command('resend_activation_emails', chunk_size=2, stdout=out)
+        self.assertIn('Sent 5 activation emails, 0 failed, over 1 connections', out.getvalue())
+        self.assertEqual(open_mock.call_count, 1)
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        activate_path = re.search(r'(/api/accounts/user/activate/\S+/)', mail.outbox[0].body).group(1)
+        response = self.client.post(activate_path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(User.objects.get(email=_USER_INACTIVE['email']).is_active, True)
+
+    def test_deactivated_users_skipped(self):
+        # Activated by the link, never logged in, then deactivated by an admin.
+        resend_activation_emails(chunk_size=2)
+        activate_path = re.search(r'(/api/accounts/user/activate/\S+/)', mail.outbox[0].body).group(1)
+        self.assertEqual(self.client.post(activate_path).status_code, 200)
+        User.objects.filter(email=self.emails[0]).update(is_active=False)
+        mail.outbox = []
+        resend_activation_emails(chunk_size=2)
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails[1:])
+
+    def test_resend_queries(self):
+        # 5 users in chunks of 2.
+        with self.assertNumQueries(3):
+            self.assertEqual(resend_activation_emails(chunk_size=2), (5, 0, 1))
+
+    def test_resume_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'resend.json')
+            send_messages = EmailBackend.send_messages
+
+            def send_or_interrupt(backend, messages):
+                if len(mail.outbox) == 3:
+                    raise KeyboardInterrupt()
+                return send_messages(backend, messages)
+
+            with mock.patch.object(EmailBackend, 'send_messages', autospec=True, side_effect=send_or_interrupt):
+                with self.assertRaises(KeyboardInterrupt):
+                    resend_activation_emails(chunk_size=2, checkpoint_path=path)
+            self.assertTrue(os.path.exists(path))
+            # The interrupted chunk is sent again.
+            self.assertEqual(resend_activation_emails(chunk_size=2, checkpoint_path=path), (5, 0, 1))
+            self.assertFalse(os.path.exists(path))
+        self.assertEqual([message.to[0] for message in mail.outbox], self.emails[:3] + self.emails[2:])
+
+    def test_joined_before(self):
+        User.objects.filter(email__startswith='inactive').update(date_joined=timezone.now() + timedelta(days=1))
+        self.assertEqual(resend_activation_emails(joined_before=timezone.now()), (1, 0, 1))
+        self.assertEqual([message.to[0] for message in mail.outbox], [_USER_INACTIVE['email']])
+
+    @override_settings(EMAIL_OUTBOX=True, EMAIL_OUTBOX_INTERVAL=None)
+    def test_outbox(self):
+        self.assertEqual(resend_activation_emails(chunk_size=2), (5, 0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(OutgoingEmail.objects.values_list('to', flat=True)), sorted(self.emails))
+
+    def test_rate_limiter(self):
+        with mock.patch('accounts.activation.time') as time_mock:
+            time_mock.monotonic.return_value = 10.0
+            limiter = RateLimiter(rate=4)
+            for _ in range(3):
+                limiter.wait()
+        self.assertEqual([call[0][0] for call in time_mock.sleep.call_args_list], [0.25, 0.5])
+
+
+class TestsLoadBenchmark(APITestCase):
+    """
+    Tests for the load benchmark statistics.
+    """
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, percent) for percent in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile(list(range(1, 11)), 50), 5)
+        self.assertEqual(percentile(list(range(1, 11)), 7), 1)
+        self.assertEqual(percentile([3], 99), 3)
@@ -0,0 +1,84 @@
+from accounts.filters import prefix_range
+from accounts.models import (
+    Token,
+    User,
+)
+from .conftest import _USER
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+import pytest
+from rest_framework.test import APITestCase
+
+
+_FULL_SCAN = r'SCAN (TABLE )?accounts_token(?! USING)'
+
+
+def _query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(row[-1] for row in cursor.fetchall())
+
+
+@pytest.mark.usefixtures('fixture_user')
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='EXPLAIN QUERY PLAN is SQLite specific.')
+class TestsTokenIndexes(APITestCase):
+    """
+    Tests for the indexes serving the token queries.
+    """
+    def setUp(self):
+        self.user_obj = User.objects.get(email=_USER['email'])
+
+    def test_purgeable_tokens_use_index(self):
+        plan = _query_plan(Token.objects.purgeable().values_list('key', flat=True)[:1000])
+        self.assertIn('token_logout_updated_idx', plan)
+        self.assertNotRegex(plan, _FULL_SCAN)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_active_tokens_use_index(self):
+        plan = _query_plan(Token.objects.active(self.user_obj).values_list('key', flat=True))
+        self.assertIn('token_user_logout_idx', plan)
+        self.assertNotRegex(plan, _FULL_SCAN)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_default_ordering_uses_index(self):
+        plan = _query_plan(Token.objects.all())
+        self.assertIn('token_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@pytest.mark.skipif(connection.vendor != 'sqlite', reason='EXPLAIN QUERY PLAN is SQLite specific.')
+class TestsUserIndexes(APITestCase):
+    """
+    Tests for the indexes serving the user queries.
+    """
+    def test_user_page_uses_index(self):
+        now = timezone.now()
+        queryset = User.objects.filter(
+            Q(date_joined__gt=now) | Q(date_joined=now, pk__gt=1)
+        ).order_by('date_joined', 'pk')[:101]
+        plan = _query_plan(queryset)
+        self.assertIn('user_date_joined_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_first_user_page_uses_index(self):
+        plan = _query_plan(User.objects.order_by('date_joined', 'pk')[:101])
+        self.assertIn('user_date_joined_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_boolean_filters_use_index(self):
+        for field, index in (('is_active', 'user_active_joined_idx'), ('is_admin', 'user_admin_joined_idx')):
+            plan = _query_plan(User.objects.filter(**{field: True}).order_by('date_joined', 'pk')[:101])
+            self.assertIn(index, plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_last_login_range_uses_index(self):
+        now = timezone.now()
+        plan = _query_plan(User.objects.filter(last_login__gte=now, last_login__lt=now))
+        self.assertIn('user_last_login_idx', plan)
+
+    def test_prefix_search_uses_indexes(self):
+        plan = _query_plan(User.objects.filter(prefix_range('email', 'mark') | prefix_range('last_name', 'mark')))
+        self.assertIn('user_last_name_idx', plan)
+        self.assertNotRegex(plan, r'SCAN (TABLE )?accounts_user(?! USING)')
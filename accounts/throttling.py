@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+import hashlib
+import threading
+import time
+
+
+def parse_rate(rate):
+    """
+    Parses a rate such as '10/min' into (number of requests, window in seconds).
+    """
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+def estimate(current, previous, elapsed):
+    """
+    Sliding window estimate from the counts of the current and the previous fixed window,
+    `elapsed` being the elapsed part (0-1) of the current window.
+    """
+    return previous * (1 - elapsed) + current
+
+
+def get_wait(current, previous, elapsed, limit, window):
+    """
+    Seconds until the sliding window estimate allows one more request.
+    """
+    if previous and current < limit:
+        return max((1 - (limit - 1 - current) / previous - elapsed) * window, 0)
+    return (1 - elapsed) * window
+
+
+class LocalSlidingWindowCounter:
+    """
+    In-process sliding window counter. Only the counts of the current and the previous fixed window
+    are kept for every key.
+    """
+    cleanup_every = 10000
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def hit(self, key, limit, window, now=None):
+        """
+        Counts a hit of the key if allowed. Returns (allowed, seconds to wait).
+        """
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now / window, 1)
+        with self._lock:
+            entry_index, current, previous, _ = self._counts.get(key, (index, 0, 0, 0))
+            if entry_index == index - 1:
+                current, previous = 0, current
+            elif entry_index != index:
+                current, previous = 0, 0
+            if estimate(current, previous, elapsed) + 1 > limit:
+                return False, get_wait(current, previous, elapsed, limit, window)
+            # The counts are of no use after the end of the next window.
+            self._counts[key] = (index, current + 1, previous, (index + 2) * window)
+            self._hits += 1
+            if self._hits % self.cleanup_every == 0:
+                self._counts = {key: entry for key, entry in self._counts.items() if entry[3] > now}
+        return True, 0
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class CacheSlidingWindowCounter:
+    """
+    Sliding window counter shared between processes through a Django cache.
+    """
+    key_prefix = 'accounts:throttle:'
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def hit(self, key, limit, window, now=None):
+        now = time.time() if now is None else now
+        index, elapsed = divmod(now / window, 1)
+        key = hashlib.md5(key.encode()).hexdigest()
+        current_key = '%s%s:%d' % (self.key_prefix, key, index)
+        previous_key = '%s%s:%d' % (self.key_prefix, key, index - 1)
+        counts = self.cache.get_many([current_key, previous_key])
+        current, previous = counts.get(current_key, 0), counts.get(previous_key, 0)
+        if estimate(current, previous, elapsed) + 1 > limit:
+            return False, get_wait(current, previous, elapsed, limit, window)
+        if not self.cache.add(current_key, 1, 2 * window):
+            try:
+                self.cache.incr(current_key)
+            except ValueError:
+                self.cache.set(current_key, 1, 2 * window)
+        return True, 0
+
+
+local_counter = LocalSlidingWindowCounter()
+
+
+def get_counter():
+    """
+    Returns the counter of THROTTLE_CACHE_ALIAS, or the in-process counter when it is not set.
+    """
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', None)
+    if alias:
+        return CacheSlidingWindowCounter(alias)
+    return local_counter
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Throttle with a sliding window rate of the `<view.throttle_scope>_<key_name>` scope from
+    the DEFAULT_THROTTLE_RATES setting. Not throttled when the scope has no rate.
+    """
+    key_name = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = '%s_%s' % (getattr(view, 'throttle_scope', None), self.key_name)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+        key = self.get_key(request, view)
+        if not key:
+            return True
+        limit, window = parse_rate(rate)
+        allowed, self.wait_seconds = get_counter().hit('%s:%s' % (scope, key), limit, window)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(SlidingWindowThrottle):
+    key_name = 'ip'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class EmailThrottle(SlidingWindowThrottle):
+    key_name = 'email'
+
+    def get_key(self, request, view):
+        if not isinstance(request.data, dict):
+            return None
+        email = request.data.get('email')
+        if not isinstance(email, str):
+            return None
+        return email.strip().lower()
@@ -0,0 +1,195 @@
+import atexit
+import logging
+import threading
+import time
+from accounts.cache import token_cache
+from accounts.models import (
+    Token,
+)
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Case,
+    DateTimeField,
+    F,
+    Value,
+    When,
+)
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+def start_periodic_thread(name, interval, func, event=None):
+    """
+    Starts a daemon thread calling `func` once per `interval` (timedelta). Setting `event` runs `func`
+    without waiting for the rest of the interval.
+    """
+    if event is None:
+        event = threading.Event()
+
+    def run():
+        while True:
+            event.wait(interval.total_seconds())
+            event.clear()
+            try:
+                func()
+            except Exception:
+                logger.exception('%s failed.', name)
+            finally:
+                connection.close()
+
+    thread = threading.Thread(target=run, name=name)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+class TokenTouchBuffer:
+    """
+    Collects pending token touches in memory and writes them with one bulk UPDATE per flush interval.
+    """
+    # An UPDATE takes 4 parameters per key, which keeps a chunk under the 999 parameters of older SQLite versions.
+    def __init__(self, chunk_size=200):
+        self.chunk_size = chunk_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, key, when):
+        with self._lock:
+            if key not in self._pending or self._pending[key] < when:
+                self._pending[key] = when
+
+    def flush(self):
+        """
+        Writes the pending touches with a single UPDATE per chunk of keys, every token getting its own touch
+        time through a CASE expression. A stored value newer than the touch is kept. Returns the number of
+        updated rows.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        keys = list(pending)
+        rows = 0
+        for i in range(0, len(keys), self.chunk_size):
+            chunk = keys[i:i + self.chunk_size]
+            rows += Token.objects.filter(
+                key__in=chunk,
+                updated__lt=max(pending[key] for key in chunk),
+            ).update(updated=Case(
+                *[When(key=key, updated__lt=pending[key], then=Value(pending[key], output_field=DateTimeField()))
+                  for key in chunk],
+                default=F('updated'),
+                output_field=DateTimeField()
+            ))
+        return rows
+
+    def start(self, interval):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = start_periodic_thread('token-touch-flusher', interval, self.flush)
+        atexit.register(self.flush)
+
+
+touch_buffer = TokenTouchBuffer()
+
+
+def touch_token(key, when):
+    """
+    Persists the token `updated` value, either directly or through the background touch buffer
+    when TOKEN_TOUCH_FLUSH_INTERVAL is set.
+    """
+    flush_interval = getattr(settings, 'TOKEN_TOUCH_FLUSH_INTERVAL', None)
+    if flush_interval:
+        touch_buffer.touch(key, when)
+        touch_buffer.start(flush_interval)
+        return
+    Token.objects.filter(key=key).update(updated=when)
+
+
+def issue_token(user):
+    """
+    Returns the token for a login of the user. With TOKEN_REUSE, a still valid token of the user
+    is returned instead of a new one. With TOKEN_MAX_PER_USER, the oldest tokens over the limit are
+    logged out with one UPDATE.
+    """
+    reuse = getattr(settings, 'TOKEN_REUSE', False)
+    max_tokens = getattr(settings, 'TOKEN_MAX_PER_USER', None)
+    if not reuse and not max_tokens:
+        return Token.objects.create(user=user)
+
+    tokens = Token.objects.active(user).order_by('-created')
+    if reuse:
+        now = timezone.now()
+        expired = now - settings.TOKEN_EXPIRATION_TIME
+        for token in tokens.filter(updated__gte=expired)[:1]:
+            token.updated = now
+            touch_token(token.key, now)
+            token_cache.touch(token.key, now)
+            return token
+
+    evicted = []
+    if max_tokens:
+        # Only the keys over the limit are read.
+        evicted = list(tokens.values_list('key', flat=True)[max_tokens - 1:])
+    token = Token.objects.create(user=user)
+    if evicted:
+        Token.objects.filter(key__in=evicted).update(logout=True)
+        token_cache.delete_many(evicted)
+    return token
+
+
+def purge_tokens(batch_size=500, sleep=0):
+    """
+    Deletes logged out and expired tokens. Every batch of at most `batch_size` tokens is selected through
+    the (logout, updated) index and deleted in its own short statement, so no long lock is held on the table.
+    The default batch keeps the statement under the 999 parameters of older SQLite versions.
+    Returns the number of deleted tokens.
+    """
+    queryset = Token.objects.purgeable()
+    deleted = 0
+    while True:
+        keys = list(queryset.values_list('key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        # The post_delete receiver only drops a token from the token cache, which is done below for the whole
+        # batch. Bypassing it with the raw delete spares loading every row, which a QuerySet.delete() with
+        # a receiver connected does.
+        deleted += queryset.filter(key__in=keys)._raw_delete(queryset.db)
+        token_cache.delete_many(keys)
+        if sleep:
+            time.sleep(sleep)
+
+
+class TokenPurger:
+    """
+    Purges logged out and expired tokens in a background thread, once per interval.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, interval):
+        with self._lock:
+            if self._thread is None:
+                self._thread = start_periodic_thread('token-purger', interval, purge_tokens)
+
+
+token_purger = TokenPurger()
+
+
+def start_token_purger():
+    """
+    Starts the token purger when TOKEN_PURGE_INTERVAL is set. Called from the WSGI entry point, so the purge
+    doesn't run in the management commands and the tests.
+    """
+    interval = getattr(settings, 'TOKEN_PURGE_INTERVAL', None)
+    if interval:
+        token_purger.start(interval)
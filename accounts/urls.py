@@ -1,7 +1,10 @@
 from django.conf.urls import url
 from .views import (
     UserActivateAPIView,
+    UserBulkUpdateAPIView,
     UserCreateAPIView,
+    UserExportAPIView,
+    UserImportAPIView,
     UserListCreateAPIView,
     UserLoginAPIView,
     UserLogoutAPIView,
@@ -23,5 +26,8 @@ urlpatterns = [
     url(r'^user/password-reset/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$',
         UserPasswordResetTokenAPIView.as_view(), name='password-reset-token'),
     url(r'^users/$', UserListCreateAPIView.as_view(), name='user-list'),
+    url(r'^users/export/$', UserExportAPIView.as_view(), name='user-export'),
+    url(r'^users/import/$', UserImportAPIView.as_view(), name='user-import'),
+    url(r'^users/bulk-update/$', UserBulkUpdateAPIView.as_view(), name='user-bulk-update'),
     url(r'^users/(?P<pk>\d+)/$', UserRetrieveUpdateAPIView.as_view(), name='user-retrieve-update'),
 ]
@@ -1,12 +1,24 @@
-from .authentication import AccountActivationTokenGenerator
+from .activation import (
+    ACTIVATION_SUBJECT,
+    build_activation_emails,
+)
+from .authentication import (
+    AccountActivationTokenGenerator,
+    get_token_from_request,
+    SignedTokenAuthentication,
+)
+from .bulk import bulk_update_users
+from .cache import token_cache
 from django.conf import settings
 from django.contrib.auth import (
     get_user_model,
     logout,
 )
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.signing import BadSignature
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.encoding import (
     force_bytes,
     force_text,
@@ -15,7 +27,23 @@ from django.utils.http import (
     urlsafe_base64_decode,
     urlsafe_base64_encode,
 )
+from .export import (
+    EXPORT_FORMATS,
+    iter_users,
+)
+from .filters import UserFilterBackend
+from .hashers import set_password
+from .imports import (
+    IMPORT_FORMATS,
+    import_users,
+)
+from .mail import (
+    render_email,
+    send_email,
+)
 from .models import Token
+from .pagination import UserCursorPagination
+from .principal import get_principal
 from .permissions import (
     IsAdmin,
     IsAuthenticatedAndActive,
@@ -30,7 +58,12 @@ from rest_framework.generics import (
     UpdateAPIView,
 )
 from rest_framework.permissions import AllowAny
+from .signing import (
+    revoke_signed_tokens,
+    SignedToken,
+)
 from .serializers import (
+    AdminUserBulkUpdateSerializer,
     AdminUserListCreateSerializer,
     UserCreateSerializer,
     UserLoginSerializer,
@@ -40,9 +73,14 @@ from .serializers import (
     UserRetrieveUpdateSerializer,
     AdminUserRetrieveUpdateSerializer,
 )
+from .throttling import (
+    EmailThrottle,
+    IPThrottle,
+)
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.views import APIView
+import codecs
 
 
 User = get_user_model()
@@ -62,7 +100,8 @@ class UserActivateAPIView(APIView):
             raise ValidationError({'detail': 'User does not exists.'})
         if user_obj and AccountActivationTokenGenerator().check_token(user_obj, token):
             user_obj.is_active = True
-            user_obj.save()
+            user_obj.activated = user_obj.activated or timezone.now()
+            user_obj.save(update_fields=['is_active', 'activated', 'updated'])
         else:
             raise ValidationError({'detail': 'Activation link is invalid.'})
         return Response({'detail': 'Your account has been activated.'})
@@ -76,41 +115,31 @@ class UserCreateAPIView(CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserCreateSerializer
     permission_classes = (AllowAny,)
+    throttle_classes = (IPThrottle, EmailThrottle,)
+    throttle_scope = 'register'
 
     def post(self, request, *args, **kwargs):
         data = request.data
         serializer = self.get_serializer(data=data)
         if serializer.is_valid():
-            serializer.save()
-            email = data['email']
-            user_obj = User.objects.get(email=email)
-            uid = urlsafe_base64_encode(force_bytes(user_obj.id)).decode("utf-8")
-            token = AccountActivationTokenGenerator().make_token(user_obj)
-            send_email = self.send_activation_email(email, uid, token)
+            if getattr(settings, 'EMAIL_OUTBOX', False):
+                # The user and the queued activation email are committed together.
+                with transaction.atomic():
+                    user_obj = serializer.save()
+                    send_email = self.send_activation_email(user_obj)
+            else:
+                # Sent over SMTP outside of a transaction, which would be held open during the delivery.
+                user_obj = serializer.save()
+                send_email = self.send_activation_email(user_obj)
             if send_email:
                 return Response({'detail': 'An activation e-mail has been sent to your email address.'})
             raise ValidationError({'detail': 'An activation e-mail has not been sent. \
                                               Please contact the administration.'})
         return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
 
-    def send_activation_email(self, email, uid, token):
-        user_obj = User.objects.get(email=email)
-        subject = "Activate your account."
-        activate_url = settings.UI_URL + settings.UI_ACCOUNT_ACTIVATE_PATH + uid + '/' + token + '/'
-        msg_html = render_to_string('accounts/activate_account.html', {
-            'first_name': user_obj.first_name,
-            'activate_url': activate_url,
-        })
-        from_email = settings.DEFAULT_FROM_EMAIL
-        new_email = send_mail(
-            subject,
-            msg_html,
-            from_email,
-            [user_obj.email],
-            html_message=msg_html,
-            fail_silently=False
-        )
-        return new_email
+    def send_activation_email(self, user_obj):
+        (to, msg_text, msg_html), = build_activation_emails([user_obj])
+        return send_email(ACTIVATION_SUBJECT, msg_text, to, html_message=msg_html)
 
 
 class UserLoginAPIView(APIView):
@@ -119,6 +148,8 @@ class UserLoginAPIView(APIView):
     Returns the user's email and token.
     """
     permission_classes = (AllowAny,)
+    throttle_classes = (IPThrottle, EmailThrottle,)
+    throttle_scope = 'login'
 
     def post(self, request, *args, **kwargs):
         data = request.data
@@ -132,18 +163,25 @@ class UserLoginAPIView(APIView):
 class UserLogoutAPIView(APIView):
     """
     User logout endpoint. Sets the token to be invalid.
+    A signed token is revoked together with all other signed tokens of the user.
     """
     permission_classes = (AllowAny,)
 
     def post(self, request):
-        try:
-            token = request.META['HTTP_AUTHORIZATION'][6:]
-            token = Token.objects.get(key=token)
+        signed_token = get_token_from_request(request, SignedTokenAuthentication.keyword)
+        if signed_token is not None:
+            try:
+                signed_token = SignedToken.from_string(signed_token)
+            except (BadSignature, ValueError):
+                return Response({'detail': 'Token has not exists.'}, status=HTTP_400_BAD_REQUEST)
             logout(request)
-            token.logout = True
-            token.save()
-        except (Token.DoesNotExist, KeyError):
+            revoke_signed_tokens(signed_token.user_id)
+            return Response({'detail': 'You have successfully logged out.'})
+        key = get_token_from_request(request)
+        if key is None or not Token.objects.filter(key=key).update(logout=True):
             return Response({'detail': 'Token has not exists.'}, status=HTTP_400_BAD_REQUEST)
+        logout(request)
+        token_cache.delete(key)
         return Response({'detail': 'You have successfully logged out.'})
 
 
@@ -162,8 +200,8 @@ class UserPasswordChangeAPIView(UpdateAPIView):
         data = request.data
         serializer = self.get_serializer(data=data)
         if serializer.is_valid(raise_exception=True):
-            instance.set_password(data['password_new'])
-            instance.save()
+            set_password(instance, data['password_new'])
+            instance.save(update_fields=['password', 'updated'])
             return Response({'detail': 'Password has been successfully updated'})
         return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
 
@@ -192,8 +230,8 @@ class UserPasswordResetTokenAPIView(UpdateAPIView):
             data = request.data
             serializer = self.get_serializer(data=data)
             if serializer.is_valid(raise_exception=True):
-                instance.set_password(data['password_new'])
-                instance.save()
+                set_password(instance, data['password_new'])
+                instance.save(update_fields=['password', 'updated'])
                 return Response({'detail': 'Password has been successfully updated'})
             return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
         raise ValidationError({'detail': 'Password Reset link is invalid.'})
@@ -205,49 +243,110 @@ class UserPasswordResetAPIView(APIView):
     Returns the message about the sent password reset link.
     """
     permission_classes = (AllowAny,)
+    throttle_classes = (IPThrottle, EmailThrottle,)
+    throttle_scope = 'password_reset'
 
     def post(self, request, *args, **kwargs):
         data = request.data
         serializer = UserPasswordResetSerializer(data=data)
         if serializer.is_valid(raise_exception=True):
-            email = data['email']
-            user_obj = User.objects.get(email=email)
+            user_obj = serializer.user_obj
             uid = urlsafe_base64_encode(force_bytes(user_obj.id)).decode("utf-8")
             token = PasswordResetTokenGenerator().make_token(user_obj)
-            send_email = self.reset_password(email, uid, token)
+            send_email = self.reset_password(user_obj, uid, token)
             if send_email:
                 return Response({'detail': 'E-mail with new password creation link has been sent.'})
             raise ValidationError({'detail': 'An e-mail with new password creation link has not been sent. \
                                              Please contact the administration.'})
         return Response(serializer.errors, status=HTTP_400_BAD_REQUEST)
 
-    def reset_password(self, email, uid, token):
-        user_obj = User.objects.get(email=email)
+    def reset_password(self, user_obj, uid, token):
         subject = "Change your account password."
         password_reset_url = settings.UI_URL + '/account/password-reset/' + uid + '/' + token + '/'
-        msg_html = render_to_string('accounts/password_reset.html', {
+        msg_html, msg_text = render_email('accounts/password_reset', {
             'first_name': user_obj.first_name,
             'password_reset_url': password_reset_url,
         })
-        from_email = settings.DEFAULT_FROM_EMAIL
-        new_email = send_mail(
-            subject,
-            msg_html,
-            from_email,
-            [user_obj.email],
-            html_message=msg_html,
-            fail_silently=False
-        )
-        return new_email
+        return send_email(subject, msg_text, user_obj.email, html_message=msg_html)
 
 
 class UserListCreateAPIView(ListCreateAPIView):
     """
     User list/create endpoint. Allowed for admin only.
+    The list is paginated with a cursor, ordered by the date joined, and filtered by UserFilterBackend.
     """
     queryset = User.objects.all()
     serializer_class = AdminUserListCreateSerializer
     permission_classes = (IsAdmin,)
+    pagination_class = UserCursorPagination
+    filter_backends = (UserFilterBackend,)
+
+
+class UserExportAPIView(APIView):
+    """
+    User export endpoint. Allowed for admin only.
+    Streams the users (with the filters of the user list) as NDJSON or, with `?export_format=csv`, as CSV.
+    """
+    permission_classes = (IsAdmin,)
+    filter_backends = (UserFilterBackend,)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': 'Must be one of: %s.' % ', '.join(sorted(EXPORT_FORMATS))})
+        queryset = User.objects.all()
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+        lines, content_type = EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(lines(iter_users(queryset)), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="users.%s"' % export_format
+        return response
+
+
+class UserImportAPIView(APIView):
+    """
+    User bulk import endpoint. Allowed for admin only.
+    Creates the users of an NDJSON or, with `?import_format=csv`, CSV request body, read line by line.
+    Returns the number of created users and the errors of the rejected rows.
+    """
+    permission_classes = (IsAdmin,)
+
+    def post(self, request, *args, **kwargs):
+        import_format = request.query_params.get('import_format', 'ndjson')
+        if import_format not in IMPORT_FORMATS:
+            raise ValidationError({'import_format': 'Must be one of: %s.' % ', '.join(sorted(IMPORT_FORMATS))})
+        # An undecodable line is rejected as an invalid row.
+        lines = codecs.iterdecode(request.stream or [], 'utf-8', errors='replace')
+        result = import_users(IMPORT_FORMATS[import_format](lines))
+        return Response(result.as_dict())
+
+
+class UserBulkUpdateAPIView(APIView):
+    """
+    User bulk update endpoint. Allowed for admin only.
+    Sets `is_active`, `is_admin` or `is_superuser` of the users selected by `ids` and/or the filters of the user list
+    with one UPDATE. Their tokens are revoked when a flag is set to false, unless `revoke_tokens` is false,
+    and kept when flags are only granted, unless `revoke_tokens` is true.
+    """
+    permission_classes = (IsAdmin,)
+    filter_backends = (UserFilterBackend,)
+
+    def patch(self, request, *args, **kwargs):
+        serializer = AdminUserBulkUpdateSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        queryset = User.objects.all()
+        filtered = False
+        for backend in self.filter_backends:
+            backend = backend()
+            filtered = filtered or any(request.query_params.get(param) for param in backend.get_params())
+            queryset = backend.filter_queryset(request, queryset, self)
+        if 'ids' in serializer.validated_data:
+            queryset = queryset.filter(id__in=serializer.validated_data['ids'])
+        elif not filtered:
+            raise ValidationError({'detail': 'Select the users by ids or filters.'})
+        result = bulk_update_users(queryset, serializer.changes,
+                                   revoke_tokens=serializer.validated_data.get('revoke_tokens'))
+        return Response(result.as_dict())
 
 
 class UserRetrieveUpdateAPIView(RetrieveUpdateAPIView):
@@ -258,6 +357,6 @@ class UserRetrieveUpdateAPIView(RetrieveUpdateAPIView):
     permission_classes = (IsAuthenticatedAndActive, IsOwnerOrAdmin,)
 
     def get_serializer_class(self):
-        if self.request.user.is_admin:
+        if get_principal(self.request).is_admin:
             return AdminUserRetrieveUpdateSerializer
         return UserRetrieveUpdateSerializer
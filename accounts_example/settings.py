@@ -35,11 +35,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'accounts_example.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+# The templates (e.g. of the emails) are compiled once per process by the cached loader, except with DEBUG,
+# so that template changes are picked up.
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -47,6 +53,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -79,6 +86,70 @@ AUTH_PASSWORD_VALIDATORS = [
 
 TOKEN_EXPIRATION_TIME = timedelta(days=1)
 
+# The token `updated` column is written only when it is older than this interval.
+TOKEN_REFRESH_INTERVAL = timedelta(minutes=1)
+
+# When set, token touches are buffered in memory and written in bulk once per interval.
+TOKEN_TOUCH_FLUSH_INTERVAL = None
+
+# When set, logged out and expired tokens are purged in the background once per interval.
+TOKEN_PURGE_INTERVAL = None
+
+# Login token policy: reuse a still valid token of the user and/or limit the number of live tokens per user.
+TOKEN_REUSE = False
+TOKEN_MAX_PER_USER = None
+
+# Read-through token cache: the shared Django cache tier and the in-process LRU tier (timeouts in seconds).
+# Disabled here, the default cache being the per-process local memory cache.
+TOKEN_CACHE_ALIAS = None
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_SIZE = 0
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+
+# Issue stateless signed tokens (used with the 'Bearer' keyword) at login instead of the Token model rows.
+SIGNED_TOKENS = False
+
+# Authenticate the request user as a compact object with the user's id, email and flags, the full User being loaded
+# only when a view needs another field.
+TOKEN_COMPACT_USER = False
+
+# Password hashing process pool (None hashes in the request thread) and its back-pressure limits.
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_QUEUE_SIZE = 0
+PASSWORD_HASHING_TIMEOUT = 5
+
+# Emails recently missed at login (timeout in seconds, disabled when the size is 0) and the constant-time response
+# for unknown emails.
+LOGIN_UNKNOWN_EMAIL_CACHE_SIZE = 0
+LOGIN_UNKNOWN_EMAIL_CACHE_TIMEOUT = 60
+LOGIN_DUMMY_HASH = False
+
+# Django cache shared by the throttle counters of all processes (None keeps them in process memory).
+THROTTLE_CACHE_ALIAS = None
+
+# Queue the emails in the database outbox and deliver them outside the request (send_queued_mail command or
+# a background thread when the interval is set) in batches sharing one SMTP connection, with retries.
+EMAIL_OUTBOX = False
+EMAIL_OUTBOX_INTERVAL = None
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+
+# Default and maximum (the `page_size` query parameter) page size of the admin user list.
+USERS_PAGE_SIZE = 100
+USERS_PAGE_MAX_SIZE = 1000
+
+# Number of users read by one query of the streaming export (endpoint and export_users command).
+USERS_EXPORT_CHUNK_SIZE = 1000
+
+# Number of rows validated, hashed and inserted together by the bulk import (endpoint and import_users command).
+USERS_IMPORT_CHUNK_SIZE = 500
+
+# Users mailed per chunk by the resend_activation_emails command and its email rate limit (per second, None for
+# no limit).
+ACTIVATION_RESEND_CHUNK_SIZE = 100
+ACTIVATION_RESEND_RATE = None
+
 PASSWORD_RESET_TIMEOUT_DAYS = 1
 
 REST_FRAMEWORK = {
@@ -88,7 +159,17 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'accounts.authentication.ExpiringTokenAuthentication',
+        'accounts.authentication.SignedTokenAuthentication',
     ),
+    # Sliding window rate limits of the login, password reset and registration endpoints, per IP and per email.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'password_reset_ip': '10/min',
+        'password_reset_email': '3/min',
+        'register_ip': '10/min',
+        'register_email': '3/min',
+    },
 }
 
 EMAIL_HOST = 'in-v3.mailjet.com'
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "accounts_example.settings")
 
 application = get_wsgi_application()
+
+# The background token purge runs in the serving processes only, not in the management commands.
+from accounts.tokens import start_token_purger  # noqa: E402
+start_token_purger()
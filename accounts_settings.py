@@ -8,11 +8,49 @@ AUTH_USER_MODEL = 'accounts.User'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'accounts.authentication.ExpiringTokenAuthentication',
+        'accounts.authentication.SignedTokenAuthentication',
     ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '30/min',
+        'login_email': '10/min',
+        'password_reset_ip': '10/min',
+        'password_reset_email': '3/min',
+        'register_ip': '10/min',
+        'register_email': '3/min',
+    },
 }
 
 # accounts settings variables
 TOKEN_EXPIRATION_TIME = timedelta(days=1)
+TOKEN_REFRESH_INTERVAL = timedelta(minutes=1)
+TOKEN_TOUCH_FLUSH_INTERVAL = None
+TOKEN_PURGE_INTERVAL = None
+TOKEN_REUSE = False
+TOKEN_MAX_PER_USER = None
+TOKEN_CACHE_ALIAS = None
+TOKEN_CACHE_TIMEOUT = 300
+TOKEN_CACHE_LOCAL_SIZE = 0
+TOKEN_CACHE_LOCAL_TIMEOUT = 5
+SIGNED_TOKENS = False
+TOKEN_COMPACT_USER = False
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_QUEUE_SIZE = 0
+PASSWORD_HASHING_TIMEOUT = 5
+LOGIN_UNKNOWN_EMAIL_CACHE_SIZE = 0
+LOGIN_UNKNOWN_EMAIL_CACHE_TIMEOUT = 60
+LOGIN_DUMMY_HASH = False
+THROTTLE_CACHE_ALIAS = None
+EMAIL_OUTBOX = False
+EMAIL_OUTBOX_INTERVAL = None
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_DELAY = timedelta(minutes=1)
+USERS_PAGE_SIZE = 100
+USERS_PAGE_MAX_SIZE = 1000
+USERS_EXPORT_CHUNK_SIZE = 1000
+USERS_IMPORT_CHUNK_SIZE = 500
+ACTIVATION_RESEND_CHUNK_SIZE = 100
+ACTIVATION_RESEND_RATE = None
 PASSWORD_RESET_TIMEOUT_DAYS = 1
 
 EMAIL_HOST = 'smtp.example.com'
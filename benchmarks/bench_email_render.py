@@ -0,0 +1,61 @@
+"""
+Compares rendering the activation email with render_to_string on every send to the email rendering service
+(HTML and text parts), for single sends and for a bulk batch, with and without the cached template loader.
+"""
+import argparse
+import copy
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--emails', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from accounts.mail import (
+        render_email,
+        render_emails,
+    )
+    from django.conf import settings
+    from django.template.loader import render_to_string
+    from django.test.utils import override_settings
+
+    contexts = [{'first_name': 'User %s' % i, 'activate_url': 'http://example.com/activate/%s/' % i}
+                for i in range(args.emails)]
+
+    def render_to_string_each():
+        for context in contexts:
+            render_to_string('accounts/activate_account.html', context)
+
+    def render_email_each():
+        for context in contexts:
+            render_email('accounts/activate_account', context)
+
+    def render_emails_batch():
+        render_emails('accounts/activate_account', contexts)
+
+    cached = copy.deepcopy(settings.TEMPLATES)
+    cached[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)]
+    uncached = copy.deepcopy(settings.TEMPLATES)
+    uncached[0]['OPTIONS']['loaders'] = settings.TEMPLATE_LOADERS
+    rows = []
+    for loader, templates in (('cached', cached), ('uncached', uncached)):
+        for name, func in (('render_to_string (HTML only)', render_to_string_each),
+                           ('render_email (HTML + text)', render_email_each),
+                           ('render_emails batch (HTML + text)', render_emails_batch)):
+            # A new engine per measure, so the cached loader starts empty.
+            with override_settings(TEMPLATES=templates):
+                start = time.perf_counter()
+                func()
+                seconds = time.perf_counter() - start
+            rows.append(('%s, %s' % (name, loader), '%.1f' % (seconds * 1000000 / args.emails),
+                         '%.0f' % (args.emails / seconds)))
+    print_table('%d activation emails' % args.emails, ('rendering', 'us/email', 'emails/s'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Drives every route of accounts/urls.py through the test client and records the query count (without
+the transaction control statements), wall time and CPU time per call. Exits with status 1 when a call exceeds
+the budget file, or when a route has no scenario. With --report, the results are also written as a JSON report,
+to be diffed across releases.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+    without_throttling,
+)
+
+
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.json')
+PASSWORD = 'UserUser#123'
+
+
+class Scenarios:
+    """
+    One method per scenario, named after its budget entry. A scenario prepares the state of one call
+    (not measured) and returns (route name, the call).
+    """
+    def __init__(self, client):
+        self.client = client
+        self.user_obj = self.create_user('bench-user@example.com')
+        self.admin_obj = self.create_user('bench-admin@example.com', is_admin=True)
+        self.count = 0
+
+    def create_user(self, email, is_active=True, is_admin=False):
+        from accounts.models import User
+        user_obj = User(email=email, first_name='Bench', last_name='User', is_active=is_active, is_admin=is_admin)
+        user_obj.set_password(PASSWORD)
+        user_obj.save()
+        return user_obj
+
+    def new_email(self):
+        self.count += 1
+        return 'bench-new-%s@example.com' % self.count
+
+    def authenticate(self, user_obj):
+        from accounts.models import Token
+        token = Token.objects.create(user=user_obj)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+
+    def anonymous(self):
+        self.client.credentials()
+
+    def uid(self, user_obj):
+        from django.utils.encoding import force_bytes
+        from django.utils.http import urlsafe_base64_encode
+        return urlsafe_base64_encode(force_bytes(user_obj.id)).decode('utf-8')
+
+    def login(self):
+        self.anonymous()
+        data = {'email': self.user_obj.email, 'password': PASSWORD}
+        return 'login', lambda: self.client.post('/api/accounts/login/', data=data)
+
+    def logout(self):
+        self.authenticate(self.user_obj)
+        return 'logout', lambda: self.client.post('/api/accounts/logout/')
+
+    def register(self):
+        self.anonymous()
+        data = {'email': self.new_email(), 'first_name': 'Bench', 'last_name': 'User',
+                'password': PASSWORD, 'password_confirm': PASSWORD}
+        return 'register', lambda: self.client.post('/api/accounts/register/', data=data)
+
+    def user_activate(self):
+        from accounts.authentication import AccountActivationTokenGenerator
+        self.anonymous()
+        user_obj = self.create_user(self.new_email(), is_active=False)
+        url = '/api/accounts/user/activate/%s/%s/' % (
+            self.uid(user_obj), AccountActivationTokenGenerator().make_token(user_obj))
+        return 'user-activate', lambda: self.client.post(url)
+
+    def password_change(self):
+        self.authenticate(self.user_obj)
+        data = {'password': PASSWORD, 'password_new': PASSWORD, 'password_new_confirm': PASSWORD}
+        return 'password-change', lambda: self.client.put('/api/accounts/user/password-change/', data=data)
+
+    def password_reset(self):
+        self.anonymous()
+        data = {'email': self.user_obj.email}
+        return 'password-reset', lambda: self.client.post('/api/accounts/user/password-reset/', data=data)
+
+    def password_reset_token(self):
+        from accounts.models import User
+        from django.contrib.auth.tokens import PasswordResetTokenGenerator
+        self.anonymous()
+        self.user_obj = User.objects.get(pk=self.user_obj.pk)
+        url = '/api/accounts/user/password-reset/%s/%s/' % (
+            self.uid(self.user_obj), PasswordResetTokenGenerator().make_token(self.user_obj))
+        data = {'password_new': PASSWORD, 'password_new_confirm': PASSWORD}
+        return 'password-reset-token', lambda: self.client.put(url, data=data)
+
+    def user_list(self):
+        self.authenticate(self.admin_obj)
+        return 'user-list', lambda: self.client.get('/api/accounts/users/')
+
+    def user_create(self):
+        self.authenticate(self.admin_obj)
+        data = {'email': self.new_email(), 'first_name': 'Bench', 'last_name': 'User',
+                'password': PASSWORD, 'password_confirm': PASSWORD}
+        return 'user-list', lambda: self.client.post('/api/accounts/users/', data=data)
+
+    def user_export(self):
+        self.authenticate(self.admin_obj)
+
+        def call():
+            response = self.client.get('/api/accounts/users/export/')
+            b''.join(response.streaming_content)
+            return response
+        return 'user-export', call
+
+    def user_import(self):
+        self.authenticate(self.admin_obj)
+        content = '\n'.join(json.dumps({'email': self.new_email(), 'first_name': 'Bench', 'last_name': 'User',
+                                        'password': PASSWORD, 'password_confirm': PASSWORD}) for _ in range(20))
+        return 'user-import', lambda: self.client.generic(
+            'POST', '/api/accounts/users/import/', content, 'application/x-ndjson')
+
+    def user_bulk_update(self):
+        # 20 users with a token each, deactivated by one call.
+        for _ in range(20):
+            self.authenticate(self.create_user(self.new_email()))
+        self.authenticate(self.admin_obj)
+        data = {'is_active': False}
+        return 'user-bulk-update', lambda: self.client.patch(
+            '/api/accounts/users/bulk-update/?is_admin=false&search=bench-new-', data=data, format='json')
+
+    def user_retrieve(self):
+        self.authenticate(self.user_obj)
+        url = '/api/accounts/users/%s/' % self.user_obj.id
+        return 'user-retrieve-update', lambda: self.client.get(url)
+
+    def user_update(self):
+        self.authenticate(self.user_obj)
+        url = '/api/accounts/users/%s/' % self.user_obj.id
+        return 'user-retrieve-update', lambda: self.client.patch(url, data={'first_name': 'Bench'})
+
+
+def is_transaction_control(sql):
+    return sql.split(' ', 1)[0].upper() in ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def measure(scenario, rounds):
+    from django.db import (
+        connection,
+        reset_queries,
+    )
+    from django.test.utils import CaptureQueriesContext
+
+    queries, wall, cpu = [], [], []
+    route = None
+    for _ in range(rounds):
+        route, call = scenario()
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            response = call()
+            wall.append((time.perf_counter() - wall_start) * 1000)
+            cpu.append((time.process_time() - cpu_start) * 1000)
+        assert response.status_code < 400, (route, response.status_code, getattr(response, 'data', None))
+        queries.append(sum(1 for query in captured.captured_queries if not is_transaction_control(query['sql'])))
+    return route, {
+        'queries': max(queries),
+        'wall_ms': {'mean': statistics.mean(wall), 'max': max(wall)},
+        'cpu_ms': {'mean': statistics.mean(cpu), 'max': max(cpu)},
+    }
+
+
+def check_budget(result, budget):
+    """
+    Returns the exceeded budget entries.
+    """
+    exceeded = []
+    if 'queries' in budget and result['queries'] > budget['queries']:
+        exceeded.append('queries %s > %s' % (result['queries'], budget['queries']))
+    for metric in ('wall_ms', 'cpu_ms'):
+        if metric in budget and result[metric]['mean'] > budget[metric]:
+            exceeded.append('%s %.1f > %s' % (metric, result[metric]['mean'], budget[metric]))
+    return exceeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--budgets', default=BUDGETS, help='JSON file of the budgets per scenario.')
+    parser.add_argument('--report', default=None, help='Path of the JSON report (not written by default).')
+    args = parser.parse_args()
+
+    with open(args.budgets) as budgets_file:
+        budgets = json.load(budgets_file)
+
+    setup_django()
+    from accounts.urls import urlpatterns
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    report = {'rounds': args.rounds, 'scenarios': {}}
+    failures = []
+    covered = set()
+    with without_throttling(), override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+        scenarios = Scenarios(APIClient())
+        for name in sorted(budgets):
+            route, result = measure(getattr(scenarios, name.replace('-', '_')), args.rounds)
+            covered.add(route)
+            result['budget'] = budgets[name]
+            result['exceeded'] = check_budget(result, budgets[name])
+            report['scenarios'][name] = result
+            failures.extend('%s: %s' % (name, exceeded) for exceeded in result['exceeded'])
+    missing = sorted(pattern.name for pattern in urlpatterns if pattern.name not in covered)
+    failures.extend('%s: no scenario' % name for name in missing)
+    report['failures'] = failures
+
+    title = 'Endpoints (%d rounds)' % args.rounds
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=2, sort_keys=True)
+        title += ', report in %s' % args.report
+    rows = [(name, result['queries'], '%.1f' % result['wall_ms']['mean'], '%.1f' % result['cpu_ms']['mean'],
+             'FAIL' if result['exceeded'] else 'ok') for name, result in sorted(report['scenarios'].items())]
+    print_table(title,
+                ('scenario', 'queries', 'wall ms', 'CPU ms', 'budget'), rows)
+    if failures:
+        print('FAIL:\n' + '\n'.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+"""
+Replays recorded request sequences (e.g. login, authenticated calls, logout) with concurrent virtual users and
+reports the p50/p95/p99 latency and the throughput per endpoint.
+
+The traffic is a JSONL file with one request per line:
+
+    {"name": "login", "method": "POST", "path": "/api/accounts/login/",
+     "body": {"email": "{{email}}", "password": "{{password}}"}, "save": {"token": "token"}}
+
+`{{variable}}` placeholders are replaced in the path, headers and body, and `save` stores fields of the JSON
+response as variables for the next requests of the virtual user. A Postman collection (v2.1) is replayed the same
+way, with the variables of a Postman environment file and `pm.environment.set("x", body.y)` test scripts.
+
+Without --url the requests go to the WSGI application in-process, on a throwaway database with one user
+(`{{email}}`, `{{password}}`, `{{user_id}}`) per virtual user and without the endpoint rate limits.
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+    without_throttling,
+)
+
+
+TRAFFIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'traffic', 'session.jsonl')
+PASSWORD = 'UserUser#123'
+PLACEHOLDER = re.compile(r'{{(\w+)}}')
+POSTMAN_SAVE = re.compile(r'pm\.environment\.set\(\s*["\'](\w+)["\']\s*,\s*body\.(\w+)\s*\)')
+
+
+def load_jsonl(path):
+    with open(path) as traffic_file:
+        return [json.loads(line) for line in traffic_file if line.strip()]
+
+
+def load_postman(path, environment_path=None):
+    """
+    Returns the requests of a Postman collection and the variables of the environment.
+    """
+    with open(path) as collection_file:
+        collection = json.load(collection_file)
+    variables = {}
+    if environment_path:
+        with open(environment_path) as environment_file:
+            variables = {value['key']: value['value'] for value in json.load(environment_file)['values']
+                         if value.get('enabled', True)}
+
+    steps = []
+
+    def add_items(items):
+        for item in items:
+            if 'item' in item:
+                add_items(item['item'])
+                continue
+            request = item['request']
+            body = request.get('body') or {}
+            raw = body.get('raw') if body.get('mode') == 'raw' else None
+            scripts = '\n'.join('\n'.join(event['script'].get('exec', [])) for event in item.get('event', []))
+            steps.append({
+                'name': item['name'],
+                'method': request['method'],
+                # The base URL is the target of the replay.
+                'path': request['url']['raw'].replace('{{BASE_URL}}', ''),
+                'headers': {header['key']: header['value'] for header in request.get('header', [])
+                            if not header.get('disabled')},
+                'body': json.loads(raw) if raw else None,
+                'save': {name: field for name, field in POSTMAN_SAVE.findall(scripts)},
+            })
+
+    add_items(collection['item'])
+    return steps, variables
+
+
+def substitute(value, variables):
+    if isinstance(value, str):
+        return PLACEHOLDER.sub(lambda match: str(variables.get(match.group(1), match.group(0))), value)
+    if isinstance(value, dict):
+        return {key: substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    return value
+
+
+def parse_json(content):
+    try:
+        return json.loads(content.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+class WSGITransport:
+    """
+    Sends the requests to the WSGI application in-process, through the Django test client.
+    """
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+
+    def request(self, method, path, headers, body):
+        meta = {'HTTP_' + key.upper().replace('-', '_'): value for key, value in headers.items()
+                if key.lower() != 'content-type'}
+        data = json.dumps(body) if body is not None else ''
+        response = self.client.generic(method, path, data, content_type='application/json', **meta)
+        return response.status_code, parse_json(response.content)
+
+
+class HTTPTransport:
+    """
+    Sends the requests to a running server.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers, body):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = dict(headers, **{'Content-Type': 'application/json'})
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, parse_json(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, parse_json(e.read())
+
+
+def run_virtual_user(steps, variables, transport, iterations, results):
+    """
+    Replays the steps `iterations` times, appending (name, seconds, succeeded) to `results`.
+    """
+    for _ in range(iterations):
+        session = dict(variables)
+        for step in steps:
+            path = substitute(step['path'], session)
+            headers = substitute(step.get('headers') or {}, session)
+            body = substitute(step.get('body'), session)
+            start = time.perf_counter()
+            try:
+                status, data = transport.request(step['method'], path, headers, body)
+            except Exception:
+                status, data = None, None
+            seconds = time.perf_counter() - start
+            succeeded = status is not None and status < 400
+            results.append((step.get('name') or '%s %s' % (step['method'], step['path']), seconds, succeeded))
+            if succeeded and isinstance(data, dict):
+                for name, field in (step.get('save') or {}).items():
+                    if field in data:
+                        session[name] = data[field]
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of sorted values.
+    """
+    return values[max(math.ceil(percent * len(values) / 100.0) - 1, 0)]
+
+
+def summarize(name, samples, elapsed):
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    return {
+        'endpoint': name,
+        'requests': len(samples),
+        'errors': sum(1 for _, succeeded in samples if not succeeded),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'requests_per_second': len(samples) / elapsed,
+    }
+
+
+def seed_users(count):
+    """
+    Creates one active user per virtual user. Returns their variables.
+    """
+    from accounts.models import User
+    from django.contrib.auth.hashers import make_password
+    password = make_password(PASSWORD)
+    users = [User(email='load%s@example.com' % i, first_name='Load', last_name='User', password=password,
+                  is_active=True) for i in range(count)]
+    User.objects.bulk_create(users)
+    return [{'email': user_obj.email, 'password': PASSWORD, 'user_id': user_obj.id}
+            for user_obj in User.objects.filter(email__startswith='load').order_by('id')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('traffic', nargs='?', default=TRAFFIC,
+                        help='JSONL traffic file or Postman collection (.postman_collection.json).')
+    parser.add_argument('--environment', help='Postman environment file with the variables of the collection.')
+    parser.add_argument('--url', help='Base URL of a running server. The WSGI application is used when not set.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of virtual users.')
+    parser.add_argument('--iterations', type=int, default=10, help='Replays of the traffic per virtual user.')
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='Variable for the placeholders, e.g. --var email=user@example.com.')
+    parser.add_argument('--report', help='Path of a JSON report.')
+    args = parser.parse_args()
+
+    if args.traffic.endswith('.json'):
+        steps, variables = load_postman(args.traffic, args.environment)
+    else:
+        steps, variables = load_jsonl(args.traffic), {}
+    variables.update(var.split('=', 1) for var in args.var)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.url:
+            users = [{} for _ in range(args.concurrency)]
+            transports = [HTTPTransport(args.url) for _ in range(args.concurrency)]
+            throttling = None
+        else:
+            # The virtual users run in threads, with their own connections to a database file.
+            setup_django(test_db_name=os.path.join(directory, 'load.sqlite3'))
+            from django.db import connection
+            connection.settings_dict.setdefault('OPTIONS', {}).setdefault('timeout', 30)
+            users = seed_users(args.concurrency)
+            transports = [WSGITransport() for _ in range(args.concurrency)]
+            throttling = without_throttling()
+            throttling.enable()
+
+        results = [[] for _ in range(args.concurrency)]
+        threads = [threading.Thread(target=run_virtual_user, args=(
+            steps, dict(variables, vu=i, **users[i]), transports[i], args.iterations, results[i]))
+            for i in range(args.concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        if throttling is not None:
+            throttling.disable()
+
+    samples = {}
+    for name, seconds, succeeded in (result for thread_results in results for result in thread_results):
+        samples.setdefault(name, []).append((seconds, succeeded))
+    summaries = [summarize(name, endpoint_samples, elapsed) for name, endpoint_samples in samples.items()]
+    summaries.append(summarize('total', [sample for endpoint_samples in samples.values()
+                                         for sample in endpoint_samples], elapsed))
+    rows = [(summary['endpoint'], summary['requests'], summary['errors'], '%.1f' % summary['p50_ms'],
+             '%.1f' % summary['p95_ms'], '%.1f' % summary['p99_ms'], '%.1f' % summary['requests_per_second'])
+            for summary in summaries]
+    print_table('%d virtual users x %d iterations in %.2f seconds (%s)' % (
+                    args.concurrency, args.iterations, elapsed, args.url or 'in-process'),
+                ('endpoint', 'requests', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s'), rows)
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump({'concurrency': args.concurrency, 'iterations': args.iterations, 'seconds': elapsed,
+                       'endpoints': summaries}, report_file, indent=2)
+    if summaries[-1]['errors']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
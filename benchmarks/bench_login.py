@@ -0,0 +1,68 @@
+"""
+Measures the CPU time of the login endpoint relative to one password hash verification. Exits with status 1
+when a login costs more than --max-ratio verifications, e.g. when the password is checked twice.
+"""
+import argparse
+import sys
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+    without_throttling,
+)
+
+
+PASSWORD = 'UserUser#123'
+
+
+def cpu_time(func, rounds):
+    start = time.process_time()
+    for _ in range(rounds):
+        func()
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--max-ratio', type=float, default=1.5)
+    args = parser.parse_args()
+
+    setup_django()
+    from accounts.models import User
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    user_obj = User(email='bench@example.com', is_active=True)
+    user_obj.set_password(PASSWORD)
+    user_obj.save()
+    client = APIClient()
+    data = {'email': user_obj.email, 'password': PASSWORD}
+
+    def login():
+        response = client.post('/api/accounts/login/', data=data)
+        assert response.status_code == 200, response.data
+
+    def login_invalid_password():
+        response = client.post('/api/accounts/login/', data={'email': user_obj.email, 'password': 'invalid'})
+        assert response.status_code == 401, response.data
+
+    with override_settings(TOKEN_MAX_PER_USER=5), without_throttling():
+        login()
+        verification = cpu_time(lambda: user_obj.check_password(PASSWORD), args.rounds)
+        rows = []
+        worst = 0
+        for name, func in (('login', login), ('login, invalid password', login_invalid_password)):
+            seconds = cpu_time(func, args.rounds)
+            ratio = seconds / verification
+            worst = max(worst, ratio)
+            rows.append((name, '%.1f' % (seconds * 1000), '%.2f' % ratio))
+    rows.insert(0, ('password verification', '%.1f' % (verification * 1000), '1.00'))
+    print_table('Login CPU time (%d rounds)' % args.rounds, ('operation', 'CPU ms', 'verifications'), rows)
+    if worst > args.max_ratio:
+        print('FAIL: a login costs %.2f password verifications (max %.2f).' % (worst, args.max_ratio))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compares sending emails one by one with send_mail (a new SMTP connection per email) to the outbox delivery
+(one connection per batch), against a local stand-in SMTP server.
+"""
+import argparse
+import asyncore
+import smtpd
+import threading
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+)
+
+
+class CountingSMTPServer(smtpd.SMTPServer):
+    """
+    Accepts and drops every message, counting the connections and the messages.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = 0
+        self.messages = 0
+
+    def handle_accepted(self, conn, addr):
+        self.connections += 1
+        super().handle_accepted(conn, addr)
+
+    def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+        self.messages += 1
+
+
+def start_server():
+    server = CountingSMTPServer(('127.0.0.1', 0), None, decode_data=False)
+    thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.01})
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--emails', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    setup_django()
+    from accounts.mail import (
+        send_email,
+        send_queued_mail,
+    )
+    from django.test.utils import override_settings
+
+    server = start_server()
+    smtp_settings = {
+        'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+        'EMAIL_HOST': '127.0.0.1',
+        'EMAIL_PORT': server.socket.getsockname()[1],
+        'EMAIL_HOST_USER': '',
+        'EMAIL_HOST_PASSWORD': '',
+        'EMAIL_USE_TLS': False,
+        'EMAIL_OUTBOX_INTERVAL': None,
+    }
+
+    def send_all():
+        for i in range(args.emails):
+            send_email('Subject', 'Body', 'bench%s@example.com' % i, html_message='<p>Body</p>')
+
+    rows = []
+    for name, outbox in (('send_mail', False), ('outbox', True)):
+        server.connections = server.messages = 0
+        with override_settings(EMAIL_OUTBOX=outbox, **smtp_settings):
+            start = time.perf_counter()
+            send_all()
+            request_seconds = time.perf_counter() - start
+            if outbox:
+                send_queued_mail(batch_size=args.batch_size)
+            seconds = time.perf_counter() - start
+        assert server.messages == args.emails, server.messages
+        rows.append((name, '%.2f' % (request_seconds * 1000 / args.emails), '%.0f' % (args.emails / seconds),
+                     server.connections))
+    print_table('%d emails, outbox batch size %d' % (args.emails, args.batch_size),
+                ('delivery', 'request ms/email', 'emails/s', 'SMTP connections'), rows)
+
+
+if __name__ == '__main__':
+    main()
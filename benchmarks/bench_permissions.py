@@ -0,0 +1,68 @@
+"""
+Compares the permission checks and serializer selection of the user retrieve/update view reading the request user
+(as before the request principal) with the same checks reading the request principal.
+"""
+import time
+from accounts.principal import get_principal
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+)
+
+
+ROUNDS = 100000
+
+
+def user_checks(request, kwargs):
+    """
+    The IsAuthenticatedAndActive, IsOwnerOrAdmin and get_serializer_class() checks reading the request user.
+    """
+    user = request.user
+    return (user and user.is_authenticated and user.is_active,
+            request.user.id == int(kwargs['pk']) or request.user.is_admin,
+            request.user.is_admin)
+
+
+def principal_checks(request, kwargs):
+    principal = get_principal(request)
+    return (principal.is_active,
+            principal.is_admin or principal.user_id == int(kwargs['pk']),
+            get_principal(request).is_admin)
+
+
+def run(checks, request, kwargs):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        checks(request, kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    setup_django()
+    from accounts.authentication import ExpiringTokenAuthentication
+    from accounts.models import (
+        Token,
+        User,
+    )
+    from django.test.utils import override_settings
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    rows = []
+    for name, is_admin in (('user', False), ('admin', True)):
+        user_obj = User.objects.create(email='bench-%s@example.com' % name, is_active=True, is_admin=is_admin)
+        token = Token.objects.create(user=user_obj)
+        with override_settings(TOKEN_CACHE_ALIAS='default', TOKEN_CACHE_LOCAL_SIZE=10000):
+            request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token ' + token.key),
+                              authenticators=(ExpiringTokenAuthentication(),))
+            kwargs = {'pk': str(user_obj.id)}
+            assert user_checks(request, kwargs) == principal_checks(request, kwargs)
+            for mode, checks in (('request user', user_checks), ('principal', principal_checks)):
+                elapsed = run(checks, request, kwargs)
+                rows.append((name, mode, ROUNDS, '%.0f' % (ROUNDS / elapsed), '%.2f' % (elapsed / ROUNDS * 1e6)))
+    print_table('Permission checks of the user retrieve/update view (%d rounds)' % ROUNDS,
+                ('user', 'mode', 'rounds', 'checks/s', 'us/check'), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares the authentication throughput of the DB-backed tokens (with and without the token cache)
+and the stateless signed tokens, with the User model or the compact user (TOKEN_COMPACT_USER).
+"""
+from datetime import timedelta
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+)
+
+
+USERS = 100
+ROUNDS = 50
+
+
+def run(authentication, keys, **overrides):
+    from django.db import (
+        connection,
+        reset_queries,
+    )
+    from django.test.utils import (
+        CaptureQueriesContext,
+        override_settings,
+    )
+
+    reset_queries()
+    with override_settings(**overrides):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                for key in keys:
+                    authentication.authenticate_credentials(key)
+            elapsed = time.perf_counter() - start
+    return len(queries.captured_queries), elapsed
+
+
+def main():
+    setup_django()
+    from accounts.authentication import (
+        ExpiringTokenAuthentication,
+        SignedTokenAuthentication,
+    )
+    from accounts.models import (
+        Token,
+        User,
+    )
+    from accounts.signing import SignedToken
+
+    db_keys, signed_keys = [], []
+    for i in range(USERS):
+        user_obj = User.objects.create(email='bench%s@example.com' % i, is_active=True)
+        db_keys.append(Token.objects.create(user=user_obj).key)
+        signed_keys.append(str(SignedToken.create(user_obj)))
+
+    refresh = timedelta(minutes=1)
+    scenarios = [
+        ('DB-backed token', ExpiringTokenAuthentication(), db_keys,
+         dict(TOKEN_CACHE_ALIAS=None, TOKEN_CACHE_LOCAL_SIZE=0, TOKEN_REFRESH_INTERVAL=refresh)),
+        ('DB-backed token, locmem cache', ExpiringTokenAuthentication(), db_keys,
+         dict(TOKEN_CACHE_ALIAS='default', TOKEN_CACHE_LOCAL_SIZE=0, TOKEN_REFRESH_INTERVAL=refresh)),
+        ('DB-backed token, in-process LRU', ExpiringTokenAuthentication(), db_keys,
+         dict(TOKEN_CACHE_ALIAS='default', TOKEN_CACHE_LOCAL_SIZE=10000, TOKEN_REFRESH_INTERVAL=refresh)),
+        ('DB-backed token, compact user', ExpiringTokenAuthentication(), db_keys,
+         dict(TOKEN_CACHE_ALIAS=None, TOKEN_CACHE_LOCAL_SIZE=0, TOKEN_REFRESH_INTERVAL=refresh,
+              TOKEN_COMPACT_USER=True)),
+        ('DB-backed token, in-process LRU, compact user', ExpiringTokenAuthentication(), db_keys,
+         dict(TOKEN_CACHE_ALIAS='default', TOKEN_CACHE_LOCAL_SIZE=10000, TOKEN_REFRESH_INTERVAL=refresh,
+              TOKEN_COMPACT_USER=True)),
+        ('signed token', SignedTokenAuthentication(), signed_keys, dict()),
+        ('signed token, compact user', SignedTokenAuthentication(), signed_keys, dict(TOKEN_COMPACT_USER=True)),
+    ]
+    total = USERS * ROUNDS
+    rows = []
+    for name, authentication, keys, overrides in scenarios:
+        queries, elapsed = run(authentication, keys, **overrides)
+        rows.append((name, total, queries, '%.0f' % (total / elapsed), '%.1f' % (elapsed / total * 1e6)))
+    print_table('Authentication throughput (%d users x %d rounds)' % (USERS, ROUNDS),
+                ('mode', 'requests', 'queries', 'auth/s', 'us/auth'), rows)
+
+
+if __name__ == '__main__':
+    main()
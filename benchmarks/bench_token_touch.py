@@ -0,0 +1,79 @@
+"""
+Counts the token UPDATE statements issued by ExpiringTokenAuthentication for a burst of authenticated
+requests with different TOKEN_REFRESH_INTERVAL / TOKEN_TOUCH_FLUSH_INTERVAL settings.
+"""
+from datetime import timedelta
+import time
+from benchmarks.utils import (
+    print_table,
+    setup_django,
+)
+
+
+USERS = 50
+REQUESTS_PER_USER = 40
+
+
+def run(tokens, refresh_interval, flush_interval):
+    from accounts.authentication import ExpiringTokenAuthentication
+    from accounts.models import Token
+    from accounts.tokens import touch_buffer
+    from django.db import (
+        connection,
+        reset_queries,
+    )
+    from django.test.utils import (
+        CaptureQueriesContext,
+        override_settings,
+    )
+    from django.utils import timezone
+
+    Token.objects.update(updated=timezone.now() - timedelta(hours=1))
+    reset_queries()
+    authentication = ExpiringTokenAuthentication()
+    with override_settings(TOKEN_REFRESH_INTERVAL=refresh_interval, TOKEN_TOUCH_FLUSH_INTERVAL=flush_interval,
+                           TOKEN_CACHE_ALIAS=None, TOKEN_CACHE_LOCAL_SIZE=0):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(REQUESTS_PER_USER):
+                for token in tokens:
+                    authentication.authenticate_credentials(token.key)
+            # One flush stands for one interval of the background flusher.
+            touch_buffer.flush()
+            elapsed = time.perf_counter() - start
+    updates = sum(1 for query in queries.captured_queries if query['sql'].startswith('UPDATE'))
+    return updates, elapsed
+
+
+def main():
+    setup_django()
+    from accounts.models import (
+        Token,
+        User,
+    )
+    from accounts.tokens import touch_buffer
+
+    # The background flusher is parked so the buffer is only flushed explicitly, on this connection.
+    touch_buffer.start(timedelta(days=1))
+    tokens = []
+    for i in range(USERS):
+        user_obj = User.objects.create(email='bench%s@example.com' % i, is_active=True)
+        tokens.append(Token.objects.create(user=user_obj))
+
+    scenarios = [
+        ('write on every request', None, None),
+        ('refresh interval 60s', timedelta(seconds=60), None),
+        ('buffered, flush per interval', None, timedelta(seconds=10)),
+        ('refresh interval 60s + buffered', timedelta(seconds=60), timedelta(seconds=10)),
+    ]
+    total = USERS * REQUESTS_PER_USER
+    rows = []
+    for name, refresh_interval, flush_interval in scenarios:
+        updates, elapsed = run(tokens, refresh_interval, flush_interval)
+        rows.append((name, total, updates, '%.1f%%' % (100.0 * updates / total), '%.3f' % elapsed))
+    print_table('Token touch writes (%d users x %d requests)' % (USERS, REQUESTS_PER_USER),
+                ('scenario', 'requests', 'UPDATEs', 'writes/request', 'seconds'), rows)
+
+
+if __name__ == '__main__':
+    main()
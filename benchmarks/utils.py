@@ -0,0 +1,42 @@
+"""
+Shared helpers for the benchmark scripts. Run a benchmark from the repository root, e.g.:
+
+    python -m benchmarks.bench_token_touch
+"""
+import os
+
+
+def setup_django(test_db_name=None):
+    """
+    Configures Django with the accounts_example settings and creates a throwaway test database
+    (in memory for SQLite, unless `test_db_name` is given).
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'accounts_example.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    if test_db_name:
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = test_db_name
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def without_throttling():
+    """
+    Settings override disabling the endpoint rate limits, which a benchmark would hit on purpose.
+    """
+    from django.conf import settings
+    from django.test.utils import override_settings
+    return override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={}))
+
+
+def print_table(title, header, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(header, *rows)]
+    line = '  '.join('{:<%d}' % width for width in widths)
+    print(title)
+    print(line.format(*header))
+    print(line.format(*['-' * width for width in widths]))
+    for row in rows:
+        print(line.format(*[str(cell) for cell in row]))
+    print()